@@ -0,0 +1,59 @@
+"""Benchmark of date resolution: the previous `dateparser.parse` call per date turn vs `date_resolver.resolve_date`,
+both cold (first call for every string) and warm (cached for the current day).
+
+    python bench/date_parsing.py --number 2000"""
+
+import argparse
+import datetime
+import os
+import sys
+import time
+from typing import Callable, List
+
+import dateparser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import date_resolver  # noqa: E402
+
+SAMPLES: List[str] = ['вчера', 'сегодня', 'позавчера', '15 мая', '1 января 2024 года', '03.02', '12.12.2023',
+                      '5 дней назад', 'в прошлый понедельник', 'за вчера', 'от 9 мая', 'прошлой пятницей']
+
+
+def legacy(text: str) -> datetime.date | None:
+    parsed = dateparser.parse(text)
+    return parsed.date() if parsed is not None else None
+
+
+def measure(name: str, func: Callable[[str], datetime.date | None], number: int) -> None:
+    start = time.perf_counter()
+    for _ in range(number):
+        for text in SAMPLES:
+            func(text)
+    elapsed = time.perf_counter() - start
+    print(f'{name:<28} {elapsed / (number * len(SAMPLES)) * 1e6:10.2f} us/date')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args()
+
+    # The first call of each pays for locale loading, which is what the first requests after a deploy used to see
+    for name, func in (('dateparser.parse (first)', legacy), ('resolve_date (first)', date_resolver.resolve_date)):
+        start = time.perf_counter()
+        func(SAMPLES[0])
+        print(f'{name:<28} {(time.perf_counter() - start) * 1e3:10.2f} ms')
+
+    measure('dateparser.parse', legacy, args.number)
+
+    # Cold: the cache is dropped before every round, so the fast path and the ru-only parser are measured
+    def uncached(text: str) -> datetime.date | None:
+        date_resolver._resolve_string.cache_clear()
+        return date_resolver.resolve_date(text)
+
+    measure('resolve_date (uncached)', uncached, args.number)
+    measure('resolve_date (cached)', date_resolver.resolve_date, args.number)
+
+    for text in SAMPLES:
+        print(f'{text!r:<28} {legacy(text)!s:<12} {date_resolver.resolve_date(text)}')
@@ -0,0 +1,131 @@
+"""Benchmark of `NoteStorage.search_notes`: p50/p95/p99 latency of fuzzy title lookups over millions of notes.
+
+    SQL_QUERIES_PATH=src/data/sql_queries.json python bench/note_search.py --notes 2000000 --users 10000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from typing import List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from note_storage import Database, NoteStorage  # noqa: E402
+from reporting import percentile  # noqa: E402
+
+TITLES = ['поход в горы', 'день рождения мамы', 'первый день на работе', 'поездка на дачу', 'встреча с друзьями',
+          'концерт в филармонии', 'тренировка в зале', 'прогулка в парке', 'поход в кино', 'экзамен по физике']
+FRAGMENTS = ['сегодня с утра было солнечно', 'мы долго собирались и наконец вышли', 'по дороге встретили соседа',
+             'обед получился очень вкусным', 'вечером все устали но были довольны', 'хочу запомнить этот день',
+             'было немного грустно', 'потом пошёл дождь и мы вернулись домой']
+
+# What speech recognition makes of the titles above: (query, title it should find)
+QUERIES: List[Tuple[str, str]] = [
+    ('поход на горы', 'поход в горы'), ('день рожденья мамы', 'день рождения мамы'),
+    ('первый день работы', 'первый день на работе'), ('поездку на дачу', 'поездка на дачу'),
+    ('встреча с друзьями', 'встреча с друзьями'), ('концерт филармонии', 'концерт в филармонии'),
+    ('тренировку в зале', 'тренировка в зале'), ('прогулка по парку', 'прогулка в парке'),
+    ('поход кино', 'поход в кино'), ('экзамен физика', 'экзамен по физике')
+]
+
+# Seeding and cleanup run far longer than the pool's command timeout, which a None timeout would fall back to
+LONG_TIMEOUT = 3600.0
+
+SEED_QUERY = '''
+INSERT INTO user_notes (user_id, title, date, full_note)
+SELECT 'bench-search-' || (g % $2),
+       ($3::text[])[1 + g % array_length($3::text[], 1)] || ' ' || (g / $2),
+       current_date - (g % 3650),
+       ($4::text[])[1 + g % array_length($4::text[], 1)] || '. ' ||
+       ($4::text[])[1 + (g / 7) % array_length($4::text[], 1)] || '. ' ||
+       ($4::text[])[1 + (g / 11) % array_length($4::text[], 1)]
+FROM generate_series($1::bigint, $1::bigint + $5 - 1) AS g
+ON CONFLICT DO NOTHING
+'''
+
+
+async def seed(notes: int, users: int, batch: int) -> None:
+    conn = await Database.acquire()
+    try:
+        start = time.monotonic()
+        for offset in range(0, notes, batch):
+            await conn.execute(SEED_QUERY, offset, users, TITLES, FRAGMENTS, min(batch, notes - offset),
+                               timeout=LONG_TIMEOUT)
+            print(f'\rseeded {min(offset + batch, notes)}/{notes}', end='', flush=True)
+
+        await conn.execute('ANALYZE user_notes', timeout=LONG_TIMEOUT)
+        print(f'\nseeding took {time.monotonic() - start:.1f}s')
+    finally:
+        await Database.release(conn)
+
+
+async def search_loop(users: int, deadline: float, timeout: float,
+                      samples: List[float], hits: List[int], empty: List[int]) -> None:
+    while time.monotonic() < deadline:
+        query, expected = random.choice(QUERIES)
+        async with NoteStorage(f'bench-search-{random.randrange(users)}') as db:
+            start = time.perf_counter()
+            candidates = await db.search_notes(query, timeout=timeout)
+            samples.append(time.perf_counter() - start)
+
+        if not candidates:
+            empty[0] += 1
+        elif candidates[0]['title'].startswith(expected):
+            hits[0] += 1
+
+
+async def explain(users: int) -> None:
+    query, _ = QUERIES[0]
+    conn = await Database.acquire()
+    try:
+        plan = await conn.fetch('EXPLAIN (ANALYZE, BUFFERS) ' + NoteStorage.QUERIES['search_notes'],
+                                f'bench-search-{random.randrange(users)}', query, NoteStorage.SEARCH_LIMIT)
+    finally:
+        await Database.release(conn)
+    print('\n'.join(row[0] for row in plan))
+
+
+async def run(args: argparse.Namespace) -> None:
+    await Database.open()
+    try:
+        if not args.no_seed:
+            await seed(args.notes, args.users, args.batch)
+
+        await explain(args.users)
+
+        samples: List[float] = []
+        hits, empty = [0], [0]
+        deadline = time.monotonic() + args.duration
+        await asyncio.gather(*(search_loop(args.users, deadline, args.timeout, samples, hits, empty)
+                               for _ in range(args.concurrency)))
+
+        print(f'{len(samples)} searches in {args.duration:.1f}s: {len(samples) / args.duration:.1f} searches/s')
+        print(f'p50 {percentile(samples, 0.50) * 1000:.1f} ms, p95 {percentile(samples, 0.95) * 1000:.1f} ms, '
+              f'p99 {percentile(samples, 0.99) * 1000:.1f} ms')
+        print(f'expected title ranked first: {hits[0] / len(samples):.1%}, '
+              f'nothing found or over budget: {empty[0] / len(samples):.1%}')
+    finally:
+        if not args.keep:
+            conn = await Database.acquire()
+            try:
+                await conn.execute("DELETE FROM user_notes WHERE user_id LIKE 'bench-search-%'",
+                                   timeout=LONG_TIMEOUT)
+            finally:
+                await Database.release(conn)
+        await Database.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--notes', type=int, default=2_000_000, help='number of notes to seed')
+    parser.add_argument('--users', type=int, default=10_000, help='number of users to spread them over')
+    parser.add_argument('--batch', type=int, default=100_000, help='notes inserted per statement')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to search for')
+    parser.add_argument('--concurrency', type=int, default=8, help='number of simultaneous searches')
+    parser.add_argument('--timeout', type=float, default=NoteStorage.SEARCH_TIMEOUT, help='latency budget, seconds')
+    parser.add_argument('--no-seed', action='store_true', help='reuse notes kept by a previous run')
+    parser.add_argument('--keep', action='store_true', help='do not remove the seeded notes')
+    asyncio.run(run(parser.parse_args()))
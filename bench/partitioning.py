@@ -0,0 +1,166 @@
+"""Benchmark of the note queries against a plain and a hash-partitioned `user_notes`, including VACUUM time.
+
+    python bench/partitioning.py --notes 10000000 --users 100000 --duration 60
+"""
+
+import argparse
+import asyncio
+import datetime
+import os
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import asyncpg
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from reporting import percentile  # noqa: E402
+
+SCHEMA = 'bench_partitioning'
+PARTITIONS = 16
+LONG_TIMEOUT = 3600.0  # Seeding and indexing run far longer than a sensible command timeout
+
+COLUMNS = '''
+    id bigserial,
+    title character varying,
+    user_id character varying NOT NULL,
+    date date,
+    full_note character varying,
+    short_note character varying
+'''
+
+LAYOUTS: Dict[str, List[str]] = {
+    'plain': [
+        f'CREATE TABLE {SCHEMA}.plain ({COLUMNS}, PRIMARY KEY (id))'
+    ],
+    'hash': [
+        f'CREATE TABLE {SCHEMA}.hash ({COLUMNS}, PRIMARY KEY (user_id, id)) PARTITION BY HASH (user_id)'
+    ] + [
+        f'CREATE TABLE {SCHEMA}.hash_p{i} PARTITION OF {SCHEMA}.hash FOR VALUES WITH (MODULUS {PARTITIONS}, '
+        f'REMAINDER {i})' for i in range(PARTITIONS)
+    ]
+}
+
+# The same indexes as in docker/seed.sql, so that inserts pay the same maintenance cost
+INDEXES: List[str] = [
+    'CREATE INDEX ON {table} USING btree (user_id, date DESC, title DESC)',
+    'CREATE UNIQUE INDEX ON {table} USING btree (user_id, title, date)',
+    "CREATE INDEX ON {table} USING gin "
+    "(user_id, to_tsvector('russian', coalesce(title, '') || ' ' || coalesce(full_note, '')))",
+    'CREATE INDEX ON {table} USING gin (user_id, title gin_trgm_ops)'
+]
+
+SEED_QUERY = '''
+INSERT INTO {table} (user_id, title, date, full_note)
+SELECT 'bench-' || (g % $2), 'заметка ' || (g / $2), current_date - (g % 3650)::int,
+       repeat('сегодня был хороший день, ', 1 + (g % 20)::int)
+FROM generate_series($1::bigint, $1::bigint + $3 - 1) AS g
+'''
+
+QUERIES: Dict[str, str] = {
+    'select': 'SELECT full_note, short_note, title, date, id FROM {table} WHERE user_id = $1 AND title = $2',
+    'list': 'SELECT title, date FROM {table} WHERE user_id = $1 ORDER BY date DESC, title DESC LIMIT $2',
+    'insert': 'INSERT INTO {table} (user_id, title, date, full_note) VALUES ($1, $2, $3, $4) '
+              'ON CONFLICT (user_id, title, date) DO NOTHING RETURNING id',
+    'delete': 'DELETE FROM {table} WHERE user_id = $1 AND id = $2'
+}
+
+
+async def seed(pool: asyncpg.Pool, layout: str, notes: int, users: int, batch: int) -> None:
+    table = f'{SCHEMA}.{layout}'
+    async with pool.acquire() as conn:
+        for statement in LAYOUTS[layout]:
+            await conn.execute(statement)
+
+    # Batches go in parallel, each on its own connection
+    start = time.monotonic()
+    offsets = list(range(0, notes, batch))
+
+    async def load(offset: int) -> None:
+        async with pool.acquire() as conn:
+            await conn.execute(SEED_QUERY.format(table=table), offset, users, min(batch, notes - offset),
+                               timeout=LONG_TIMEOUT)
+
+    await asyncio.gather(*(load(offset) for offset in offsets))
+    loaded = time.monotonic()
+
+    async with pool.acquire() as conn:
+        for index in INDEXES:
+            await conn.execute(index.format(table=table), timeout=LONG_TIMEOUT)
+        await conn.execute(f'ANALYZE {table}', timeout=LONG_TIMEOUT)
+
+    print(f'{layout}: loaded {notes} notes in {loaded - start:.1f}s, indexed in {time.monotonic() - loaded:.1f}s')
+
+
+async def client(pool: asyncpg.Pool, layout: str, users: int, deadline: float,
+                 samples: Dict[Tuple[str, str], List[float]]) -> None:
+    table = f'{SCHEMA}.{layout}'
+    queries = {name: query.format(table=table) for name, query in QUERIES.items()}
+
+    async with pool.acquire() as conn:
+        async def timed(name: str, *args) -> List[asyncpg.Record]:
+            start = time.perf_counter()
+            rows = await conn.fetch(queries[name], *args)
+            samples[(layout, name)].append(time.perf_counter() - start)
+            return rows
+
+        while time.monotonic() < deadline:
+            user_id = f'bench-{random.randrange(users)}'
+            await timed('select', user_id, f'заметка {random.randrange(10)}')
+            await timed('list', user_id, 4)
+
+            # A fresh note per iteration, deleted right away, so that the table size stays the same
+            inserted = await timed('insert', user_id, f'новая {uuid.uuid4().hex}', datetime.date.today(),
+                                   'только что надиктованная заметка')
+            if inserted:
+                await timed('delete', user_id, inserted[0]['id'])
+
+
+async def run(args: argparse.Namespace) -> None:
+    pool = await asyncpg.create_pool(min_size=args.concurrency, max_size=args.concurrency)
+    try:
+        if not args.no_seed:
+            async with pool.acquire() as conn:
+                await conn.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE', timeout=LONG_TIMEOUT)
+                await conn.execute(f'CREATE SCHEMA {SCHEMA}')
+            for layout in LAYOUTS:
+                await seed(pool, layout, args.notes, args.users, args.batch)
+
+        samples: Dict[Tuple[str, str], List[float]] = defaultdict(list)
+        for layout in LAYOUTS:
+            deadline = time.monotonic() + args.duration
+            await asyncio.gather(*(client(pool, layout, args.users, deadline, samples)
+                                   for _ in range(args.concurrency)))
+
+        print(f'{"layout":<8}{"query":<8}{"count":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+        for (layout, name), values in sorted(samples.items()):
+            print(f'{layout:<8}{name:<8}{len(values):>10}{percentile(values, 0.50) * 1000:>10.2f}'
+                  f'{percentile(values, 0.95) * 1000:>10.2f}{percentile(values, 0.99) * 1000:>10.2f}')
+
+        # The benchmark has left plenty of dead tuples behind; a partitioned table is vacuumed partition by partition
+        async with pool.acquire() as conn:
+            for layout in LAYOUTS:
+                start = time.monotonic()
+                await conn.execute(f'VACUUM {SCHEMA}.{layout}', timeout=LONG_TIMEOUT)
+                print(f'{layout}: VACUUM took {time.monotonic() - start:.1f}s')
+    finally:
+        if not args.keep:
+            async with pool.acquire() as conn:
+                await conn.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE', timeout=LONG_TIMEOUT)
+        await pool.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--notes', type=int, default=10_000_000, help='number of notes to seed into each table')
+    parser.add_argument('--users', type=int, default=100_000, help='number of users to spread them over')
+    parser.add_argument('--batch', type=int, default=500_000, help='notes inserted per statement')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to run the queries for, per layout')
+    parser.add_argument('--concurrency', type=int, default=8, help='number of simultaneous clients')
+    parser.add_argument('--no-seed', action='store_true', help='reuse the tables kept by a previous run')
+    parser.add_argument('--keep', action='store_true', help='do not drop the scratch schema')
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,92 @@
+"""Microbenchmark of the per-request JSON work on the webhook path: decoding an Alice request, building the
+DialogResponse payload and encoding it. The current code is compared with the previous implementation
+(stdlib json, a `DialogResponse.json` which copied the payload and built the IDLE buttons on every call), while
+the current one shares the buttons built once by `json_codec.fragment` (pre-encoded when orjson is installed).
+
+    python bench/response_codec.py --number 20000"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import json_codec  # noqa: E402
+from dialog_manager import DialogRequest, DialogResponse, DialogStatus  # noqa: E402
+
+REQUEST: Dict[str, Any] = {
+    'meta': {'locale': 'ru-RU', 'timezone': 'Europe/Moscow', 'client_id': 'ru.yandex.searchplugin/7.16',
+             'interfaces': {'screen': {}, 'payments': {}, 'account_linking': {}}},
+    'session': {'message_id': 3, 'session_id': '2eac4854-fce721f3-b845abba-20d60', 'skill_id': 'bench',
+                'user': {'user_id': '47C73714B580ED2469056E71081159529FFC676A4E5B059D629A819E857DC2F8'},
+                'application': {'application_id': '47C73714B580ED2469056E71081159529FFC676A4E5B059D629A819E857DC2F8'},
+                'new': False},
+    'request': {
+        'command': 'расскажи поход в горы за вчера',
+        'original_utterance': 'Расскажи поход в горы за вчера',
+        'nlu': {
+            'tokens': ['расскажи', 'поход', 'в', 'горы', 'за', 'вчера'],
+            'entities': [{'type': 'YANDEX.DATETIME', 'tokens': {'start': 5, 'end': 6},
+                          'value': {'day': -1, 'day_is_relative': True}}],
+            'intents': {'find_note': {'slots': {
+                'title': {'type': 'YANDEX.STRING', 'tokens': {'start': 1, 'end': 4}, 'value': 'поход в горы'},
+                'date': {'type': 'YANDEX.STRING', 'tokens': {'start': 5, 'end': 6}, 'value': 'вчера'}}}}
+        },
+        'markup': {'dangerous_context': False},
+        'type': 'SimpleUtterance'
+    },
+    'state': {'session': {'dialog_status': '0', 'persistence': [], 'user_data': {}}},
+    'version': '1.0'
+}
+REQUEST_BODY: bytes = json.dumps(REQUEST, ensure_ascii=False).encode()
+
+
+def legacy_payload(response: Dict[str, Any], storage: Dict[str, Any]) -> Dict[str, Any]:
+    """The previous `DialogResponse.json`."""
+
+    full_response = {'response': response, 'session_state': None, 'version': '1.0'}
+    result = full_response.copy()
+    result['session_state'] = storage.copy()
+    if storage['dialog_status'] == DialogStatus.IDLE:
+        buttons = [
+            {"title": "Создать запись", "hide": True},
+            {"title": "Удалить запись", "hide": True},
+            {"title": "Мои записи", "hide": True},
+            {"title": "Посмотреть запись", "hide": True},
+        ]
+        result['response']['buttons'] = buttons
+    return result
+
+
+def legacy_roundtrip() -> bytes:
+    data = json.loads(REQUEST_BODY)
+    DialogRequest(data)
+    response = {'text': 'Для удобства могу сократить заметку и пересказать самые важные моменты. Хотите?',
+                'end_session': False}
+    storage = {'dialog_status': DialogStatus.IDLE, 'persistence': [], 'user_data': {'title': 'поход в горы'}}
+    return json.dumps(legacy_payload(response, storage)).encode()
+
+
+def current_roundtrip() -> bytes:
+    data = json_codec.loads(REQUEST_BODY)
+    req = DialogRequest(data)
+    res = DialogResponse()
+    res.transfer_persistence(req)
+    res.send_message('Для удобства могу сократить заметку и пересказать самые важные моменты. Хотите?')
+    res.send_user_data({'title': 'поход в горы'})
+    return json_codec.dumps(res.json)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f'codec backend: {json_codec.BACKEND}')
+    for name, func in (('legacy', legacy_roundtrip), ('current', current_roundtrip)):
+        best = min(timeit.repeat(func, number=args.number, repeat=args.repeat))
+        print(f'{name:<8} {best / args.number * 1e6:8.2f} us/request')
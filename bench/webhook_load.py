@@ -0,0 +1,239 @@
+"""Webhook load test: drives `app.main` through every dialog flow and reports p50/p95/p99 latency per DialogStatus.
+
+    SQL_QUERIES_PATH=src/data/sql_queries.json python bench/webhook_load.py --concurrency 32 --duration 60
+"""
+
+import argparse
+import asyncio
+import datetime
+import os
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Callable, Coroutine, Dict, List, Tuple
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+os.environ.setdefault('SHORT_NOTE_MODE', 'lazy')
+
+from app import main  # noqa: E402
+from dialog_manager import DialogRequest, DialogStatus  # noqa: E402
+from note_drafts import start_draft_buffer, cleanup_draft_buffer  # noqa: E402
+from note_storage import Database, start_db_pool, cleanup_db_pool, start_note_cache, cleanup_note_cache  # noqa: E402
+from reporting import percentile  # noqa: E402
+
+TITLES = ['поход в горы', 'день рождения мамы', 'первый день на работе', 'поездка на дачу', 'встреча с друзьями',
+          'концерт', 'тренировка', 'прогулка в парке', 'поход в кино', 'экзамен']
+FRAGMENTS = ['сегодня с утра было солнечно', 'мы долго собирались и наконец вышли', 'по дороге встретили соседа',
+             'обед получился очень вкусным', 'вечером все устали но были довольны', 'хочу запомнить этот день',
+             'было немного грустно', 'потом пошёл дождь и мы вернулись домой']
+
+Payload = Dict[str, Any]
+Flow = Callable[['VirtualUser'], Coroutine[Any, Any, None]]
+
+
+def make_entity(entity_type: str, start: int, end: int, value: Any) -> Dict[str, Any]:
+    return {'type': entity_type, 'tokens': {'start': start, 'end': end}, 'value': value}
+
+
+def relative_day_entity(start: int, end: int, days: int) -> Dict[str, Any]:
+    return make_entity('YANDEX.DATETIME', start, end, {'day': days, 'day_is_relative': True})
+
+
+class VirtualUser:
+    """A single Alice user talking to the skill: keeps session state between turns and records the latency of every
+    turn under the dialog status the skill dispatches it to."""
+
+    def __init__(self, http: aiohttp.ClientSession, url: str, samples: Dict[str, List[float]]) -> None:
+        self.http = http
+        self.url = url
+        self.samples = samples
+        self.user_id = f'bench-{uuid.uuid4().hex}'
+        self.session_id = str(uuid.uuid4())
+        self.message_id = 0
+        self.state: Dict[str, Any] = {}
+        self.errors = 0
+
+    def payload(self, utterance: str, intents: Dict[str, Any] | None = None,
+                entities: List[Dict[str, Any]] | None = None) -> Payload:
+        return {
+            'meta': {'locale': 'ru-RU', 'timezone': 'Europe/Moscow', 'client_id': 'bench',
+                     'interfaces': {'screen': {}}},
+            'session': {
+                'message_id': self.message_id,
+                'session_id': self.session_id,
+                'skill_id': 'bench',
+                'user': {'user_id': self.user_id},
+                'application': {'application_id': self.user_id},
+                'new': self.message_id == 0
+            },
+            'request': {
+                'command': utterance.lower(),
+                'original_utterance': utterance,
+                'nlu': {'tokens': utterance.lower().split(), 'entities': entities or [], 'intents': intents or {}},
+                'markup': {'dangerous_context': False},
+                'type': 'SimpleUtterance'
+            },
+            'state': {'session': self.state},
+            'version': '1.0'
+        }
+
+    async def say(self, utterance: str, intents: Dict[str, Any] | None = None,
+                  entities: List[Dict[str, Any]] | None = None) -> Dict[str, Any]:
+        data = self.payload(utterance, intents, entities)
+        status = DialogStatus(DialogRequest(data).status).name
+
+        start = time.perf_counter()
+        async with self.http.post(self.url, json=data) as res:
+            body = await res.json() if res.status == 200 else None
+        self.samples[status].append(time.perf_counter() - start)
+
+        self.message_id += 1
+        if body is None:
+            self.errors += 1
+            return {}
+
+        self.state = body['session_state']
+        return body
+
+    @property
+    def status(self) -> str:
+        return self.state.get('dialog_status', '0')
+
+
+def title_intent(name: str, prefix_len: int, title: str) -> Dict[str, Any]:
+    slot = make_entity('YANDEX.STRING', prefix_len, prefix_len + len(title.split()), title)
+    return {name: {'slots': {'title': slot}}}
+
+
+async def new_note_flow(user: VirtualUser) -> None:
+    """Multi-turn dictation of a new note."""
+
+    title = f'{random.choice(TITLES)} {uuid.uuid4().hex[:6]}'
+    await user.say(f'создай запись {title}', title_intent('new_note', 2, title))
+    for _ in range(random.randint(2, 6)):
+        await user.say(random.choice(FRAGMENTS))
+    await user.say('конец', {'stop': {'slots': {}}})
+
+
+async def find_note_flow(user: VirtualUser) -> None:
+    """Search by a title which has notes on two days, so the skill asks for the date first."""
+
+    await user.say(f'расскажи {TITLES[0]}', title_intent('find_note', 1, TITLES[0]))
+    if user.status == '8':  # FIND_NOTE_DATE_INPUT
+        await user.say('вчера', entities=[relative_day_entity(0, 1, -1)])
+    await user.say('нет', {'YANDEX.REJECT': {'slots': {}}})
+
+
+async def del_note_flow(user: VirtualUser) -> None:
+    """Deletion of an ambiguous title followed by the date input."""
+
+    title = f'удаляемая {uuid.uuid4().hex[:6]}'
+    await seed_notes(user.user_id, [title])
+    await user.say(f'удали запись {title}', title_intent('del_note', 2, title))
+    if user.status == '6':  # DEL_NOTE_DATE_INPUT
+        await user.say('вчера', entities=[relative_day_entity(0, 1, -1)])
+
+
+async def list_notes_flow(user: VirtualUser) -> None:
+    """Listing every note page by page."""
+
+    await user.say('мои записи', {'list_all_notes': {'slots': {}}})
+    while user.state.get('user_data', {}).get('cursor') is not None:
+        await user.say('далее', {'next': {'slots': {}}})
+
+
+FLOWS: Dict[str, Flow] = {
+    'new': new_note_flow,
+    'find': find_note_flow,
+    'del': del_note_flow,
+    'list': list_notes_flow
+}
+
+
+async def seed_notes(user_id: str, titles: List[str]) -> None:
+    """Give each title a note for today and yesterday, as if the user had created them over time."""
+
+    today = datetime.date.today()
+    rows: List[Tuple] = []
+    for title in titles:
+        for days_ago in (0, 1):
+            rows.append((user_id, title, today - datetime.timedelta(days=days_ago), ' '.join(FRAGMENTS)))
+
+    conn = await Database.acquire()
+    try:
+        await conn.executemany('INSERT INTO user_notes (user_id, title, date, full_note) VALUES ($1, $2, $3, $4) '
+                               'ON CONFLICT DO NOTHING', rows)
+    finally:
+        await Database.release(conn)
+
+
+async def run_user(user: VirtualUser, flows: List[Flow], deadline: float, flows_done: List[int]) -> None:
+    await seed_notes(user.user_id, TITLES)
+    while time.monotonic() < deadline:
+        user.state = {}
+        user.message_id = 0
+        await random.choice(flows)(user)
+        flows_done[0] += 1
+
+
+def report(samples: Dict[str, List[float]], elapsed: float, flows_done: int, errors: int) -> None:
+    total = sum(len(s) for s in samples.values())
+    print(f'{total} requests, {flows_done} dialogs, {errors} errors in {elapsed:.1f}s: '
+          f'{total / elapsed:.1f} req/s')
+    print(f'{"status":<24}{"count":>8}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+    for status, values in sorted(samples.items()):
+        print(f'{status:<24}{len(values):>8}{len(values) / elapsed:>10.1f}'
+              f'{percentile(values, 0.50) * 1000:>10.1f}{percentile(values, 0.95) * 1000:>10.1f}'
+              f'{percentile(values, 0.99) * 1000:>10.1f}')
+
+
+async def run(args: argparse.Namespace) -> None:
+    app = web.Application()
+    app.add_routes([web.post('/', main)])
+    app.on_startup.append(start_db_pool)
+    app.on_startup.append(start_note_cache)
+    app.on_startup.append(start_draft_buffer)
+    app.on_cleanup.append(cleanup_draft_buffer)
+    app.on_cleanup.append(cleanup_note_cache)
+    app.on_cleanup.append(cleanup_db_pool)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', args.port)
+    await site.start()
+
+    samples: Dict[str, List[float]] = defaultdict(list)
+    flows = [FLOWS[name] for name in args.flows]
+    flows_done = [0]
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as http:
+        users = [VirtualUser(http, f'http://127.0.0.1:{args.port}/', samples) for _ in range(args.concurrency)]
+        start = time.monotonic()
+        try:
+            await asyncio.gather(*(run_user(u, flows, start + args.duration, flows_done) for u in users))
+        finally:
+            elapsed = time.monotonic() - start
+            conn = await Database.acquire()
+            try:
+                await conn.execute("DELETE FROM user_notes WHERE user_id LIKE 'bench-%'")
+                await conn.execute("DELETE FROM note_drafts WHERE user_id LIKE 'bench-%'")
+            finally:
+                await Database.release(conn)
+
+    await runner.cleanup()
+    report(samples, elapsed, flows_done[0], sum(u.errors for u in users))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=16, help='number of simultaneous users')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to run')
+    parser.add_argument('--flows', nargs='+', choices=FLOWS.keys(), default=list(FLOWS.keys()))
+    parser.add_argument('--port', type=int, default=8089)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,161 @@
+-- Upgrades a database created by the original docker/seed.sql, with nothing but an unpartitioned user_notes table, to
+-- the current schema: notes get ids and a unique (user_id, title, date) key, user_notes becomes hash-partitioned, and
+-- the summary_jobs, summary_cache and note_drafts tables are created.
+--
+--     psql -v ON_ERROR_STOP=1 -d diary -f docker/migrations/001_upgrade_baseline.sql
+--
+-- The whole migration is a single transaction holding an exclusive lock on user_notes, so the skill can't access
+-- notes until it commits: every note is rewritten twice and every index is built from scratch, which takes a few
+-- minutes per ten million notes. Run it in a maintenance window. Notes without a user_id are unreachable and are not
+-- copied. A database which already has note ids (e.g. a deployment of an intermediate version) keeps them.
+
+BEGIN;
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+LOCK TABLE public.user_notes IN ACCESS EXCLUSIVE MODE;
+
+-- Note ids
+CREATE SEQUENCE IF NOT EXISTS public.user_notes_id_seq AS bigint;
+
+ALTER TABLE public.user_notes
+    ADD COLUMN IF NOT EXISTS id bigint;
+
+UPDATE public.user_notes
+SET id = nextval('public.user_notes_id_seq')
+WHERE id IS NULL;
+
+-- Concurrent inserts of the original version could store the same note twice; the earliest copy is kept
+DELETE FROM public.user_notes AS duplicate
+USING public.user_notes AS original
+WHERE duplicate.user_id = original.user_id
+  AND duplicate.title = original.title
+  AND duplicate.date = original.date
+  AND duplicate.id > original.id;
+
+CREATE TABLE public.user_notes_partitioned
+(
+    id bigint NOT NULL DEFAULT nextval('public.user_notes_id_seq'),
+    title character varying COLLATE pg_catalog."default",
+    user_id character varying COLLATE pg_catalog."default" NOT NULL,
+    date date,
+    full_note character varying COLLATE pg_catalog."default",
+    short_note character varying COLLATE pg_catalog."default"
+) PARTITION BY HASH (user_id);
+
+-- Keep the number of partitions in sync with docker/seed.sql
+DO $$
+BEGIN
+    FOR i IN 0..15 LOOP
+        EXECUTE format('CREATE TABLE public.user_notes_p%s PARTITION OF public.user_notes_partitioned '
+                       'FOR VALUES WITH (MODULUS 16, REMAINDER %s)', i, i);
+    END LOOP;
+END
+$$;
+
+-- Loading into index-less partitions and indexing afterwards is much faster than maintaining the indexes row by row
+INSERT INTO public.user_notes_partitioned (id, title, user_id, date, full_note, short_note)
+SELECT id, title, user_id, date, full_note, short_note
+FROM public.user_notes
+WHERE user_id IS NOT NULL;
+
+-- The sequence may belong to the old table's id column, and would be dropped along with it then
+ALTER SEQUENCE public.user_notes_id_seq OWNED BY NONE;
+DROP TABLE public.user_notes;
+
+ALTER TABLE public.user_notes_partitioned RENAME TO user_notes;
+ALTER SEQUENCE public.user_notes_id_seq OWNED BY public.user_notes.id;
+
+ALTER TABLE IF EXISTS public.user_notes
+    OWNER to "admin";
+
+ALTER TABLE public.user_notes
+    ADD PRIMARY KEY (user_id, id);
+
+CREATE INDEX user_notes_user_id_date_idx
+    ON public.user_notes USING btree
+    (user_id, date DESC, title DESC);
+
+CREATE UNIQUE INDEX user_notes_user_id_title_date_key
+    ON public.user_notes USING btree
+    (user_id, title, date);
+
+CREATE INDEX user_notes_search_idx
+    ON public.user_notes USING gin
+    (user_id, to_tsvector('russian', coalesce(title, '') || ' ' || coalesce(full_note, '')));
+
+CREATE INDEX user_notes_title_trgm_idx
+    ON public.user_notes USING gin
+    (user_id, title gin_trgm_ops);
+
+-- Every process caching note selections (see NoteCache) drops a user's cached notes when notified of a change
+CREATE OR REPLACE FUNCTION public.notify_note_change()
+    RETURNS trigger
+    LANGUAGE plpgsql
+AS $$
+BEGIN
+    -- Identical notifications of a transaction are delivered once, so a bulk change sends one per user
+    PERFORM pg_notify('note_changes', coalesce(NEW.user_id, OLD.user_id));
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS user_notes_notify_change ON public.user_notes;
+CREATE TRIGGER user_notes_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON public.user_notes
+    FOR EACH ROW EXECUTE FUNCTION public.notify_note_change();
+
+CREATE TABLE IF NOT EXISTS public.summary_jobs
+(
+    id bigserial PRIMARY KEY,
+    user_id character varying COLLATE pg_catalog."default" NOT NULL,
+    note_id bigint NOT NULL,
+    attempts integer NOT NULL DEFAULT 0,
+    failed boolean NOT NULL DEFAULT false,
+    last_error character varying COLLATE pg_catalog."default",
+    run_at timestamp with time zone NOT NULL DEFAULT now(),
+    created_at timestamp with time zone NOT NULL DEFAULT now()
+)
+
+TABLESPACE pg_default;
+
+ALTER TABLE IF EXISTS public.summary_jobs
+    OWNER to "admin";
+
+CREATE INDEX IF NOT EXISTS summary_jobs_run_at_idx
+    ON public.summary_jobs USING btree
+    (run_at)
+    WHERE NOT failed;
+
+CREATE TABLE IF NOT EXISTS public.summary_cache
+(
+    key character(64) PRIMARY KEY,
+    summary character varying COLLATE pg_catalog."default" NOT NULL,
+    created_at timestamp with time zone NOT NULL DEFAULT now()
+)
+
+TABLESPACE pg_default;
+
+ALTER TABLE IF EXISTS public.summary_cache
+    OWNER to "admin";
+
+CREATE TABLE IF NOT EXISTS public.note_drafts
+(
+    draft_id character varying COLLATE pg_catalog."default" NOT NULL,
+    user_id character varying COLLATE pg_catalog."default" NOT NULL,
+    seq integer NOT NULL,
+    chunk character varying COLLATE pg_catalog."default" NOT NULL,
+    created_at timestamp with time zone NOT NULL DEFAULT now(),
+    PRIMARY KEY (draft_id, seq)
+)
+
+TABLESPACE pg_default;
+
+ALTER TABLE IF EXISTS public.note_drafts
+    OWNER to "admin";
+
+COMMIT;
+
+-- Autovacuum analyzes the partitions over time, but never the partitioned table itself
+ANALYZE public.user_notes;
@@ -11,16 +11,115 @@ CREATE DATABASE diary
 
 \c diary
 
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+-- Every query filters by user_id, so notes are hash-partitioned by it: a query only touches a single partition,
+-- and vacuum and index maintenance work on partitions a fraction of the table's size.
+-- Keep the number of partitions in sync with docker/migrations/001_upgrade_baseline.sql
 CREATE TABLE IF NOT EXISTS public.user_notes
 (
+    id bigserial,
     title character varying COLLATE pg_catalog."default",
-    user_id character varying COLLATE pg_catalog."default",
+    user_id character varying COLLATE pg_catalog."default" NOT NULL,
     date date,
     full_note character varying COLLATE pg_catalog."default",
-    short_note character varying COLLATE pg_catalog."default"
+    short_note character varying COLLATE pg_catalog."default",
+    PRIMARY KEY (user_id, id)
+) PARTITION BY HASH (user_id);
+
+ALTER TABLE IF EXISTS public.user_notes
+    OWNER to "admin";
+
+DO $$
+BEGIN
+    FOR i IN 0..15 LOOP
+        EXECUTE format('CREATE TABLE IF NOT EXISTS public.user_notes_p%s PARTITION OF public.user_notes '
+                       'FOR VALUES WITH (MODULUS 16, REMAINDER %s)', i, i);
+    END LOOP;
+END
+$$;
+
+-- Indexes created on the partitioned table are created on every partition as well
+CREATE INDEX IF NOT EXISTS user_notes_user_id_date_idx
+    ON public.user_notes USING btree
+    (user_id, date DESC, title DESC);
+
+CREATE UNIQUE INDEX IF NOT EXISTS user_notes_user_id_title_date_key
+    ON public.user_notes USING btree
+    (user_id, title, date);
+
+-- Search indexes: user_id is included (btree_gin) so that a lookup never goes through other users' notes
+CREATE INDEX IF NOT EXISTS user_notes_search_idx
+    ON public.user_notes USING gin
+    (user_id, to_tsvector('russian', coalesce(title, '') || ' ' || coalesce(full_note, '')));
+
+CREATE INDEX IF NOT EXISTS user_notes_title_trgm_idx
+    ON public.user_notes USING gin
+    (user_id, title gin_trgm_ops);
+
+-- Every process caching note selections (see NoteCache) drops a user's cached notes when notified of a change
+CREATE OR REPLACE FUNCTION public.notify_note_change()
+    RETURNS trigger
+    LANGUAGE plpgsql
+AS $$
+BEGIN
+    -- Identical notifications of a transaction are delivered once, so a bulk change sends one per user
+    PERFORM pg_notify('note_changes', coalesce(NEW.user_id, OLD.user_id));
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS user_notes_notify_change ON public.user_notes;
+CREATE TRIGGER user_notes_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON public.user_notes
+    FOR EACH ROW EXECUTE FUNCTION public.notify_note_change();
+
+CREATE TABLE IF NOT EXISTS public.summary_jobs
+(
+    id bigserial PRIMARY KEY,
+    user_id character varying COLLATE pg_catalog."default" NOT NULL,
+    note_id bigint NOT NULL,
+    attempts integer NOT NULL DEFAULT 0,
+    failed boolean NOT NULL DEFAULT false,
+    last_error character varying COLLATE pg_catalog."default",
+    run_at timestamp with time zone NOT NULL DEFAULT now(),
+    created_at timestamp with time zone NOT NULL DEFAULT now()
 )
 
 TABLESPACE pg_default;
 
-ALTER TABLE IF EXISTS public.user_notes
-    OWNER to "admin";
\ No newline at end of file
+ALTER TABLE IF EXISTS public.summary_jobs
+    OWNER to "admin";
+
+CREATE INDEX IF NOT EXISTS summary_jobs_run_at_idx
+    ON public.summary_jobs USING btree
+    (run_at)
+    WHERE NOT failed;
+
+CREATE TABLE IF NOT EXISTS public.summary_cache
+(
+    key character(64) PRIMARY KEY,
+    summary character varying COLLATE pg_catalog."default" NOT NULL,
+    created_at timestamp with time zone NOT NULL DEFAULT now()
+)
+
+TABLESPACE pg_default;
+
+ALTER TABLE IF EXISTS public.summary_cache
+    OWNER to "admin";
+
+CREATE TABLE IF NOT EXISTS public.note_drafts
+(
+    draft_id character varying COLLATE pg_catalog."default" NOT NULL,
+    user_id character varying COLLATE pg_catalog."default" NOT NULL,
+    seq integer NOT NULL,
+    chunk character varying COLLATE pg_catalog."default" NOT NULL,
+    created_at timestamp with time zone NOT NULL DEFAULT now(),
+    PRIMARY KEY (draft_id, seq)
+)
+
+TABLESPACE pg_default;
+
+ALTER TABLE IF EXISTS public.note_drafts
+    OWNER to "admin";
@@ -0,0 +1,193 @@
+"""A long-lived HTTP client for Yandex Cloud APIs with per-call deadlines, circuit breaking and latency counters."""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Final
+
+import aiohttp
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimited(Exception):
+    """Raised instead of returning None when the API has answered with 429 Too Many Requests and the caller wants to
+    adapt its request rate to that."""
+
+    def __init__(self, endpoint: str, retry_after: float | None) -> None:
+        super().__init__(f'{endpoint} is rate limited')
+        self.endpoint: str = endpoint
+        self.retry_after: float | None = retry_after
+
+
+class CircuitBreaker:
+    """Stops calling an endpoint after `threshold` consecutive failures and lets a single trial call through
+    once `reset_timeout` seconds have passed."""
+
+    def __init__(self, threshold: int, reset_timeout: float) -> None:
+        self.threshold: int = threshold
+        self.reset_timeout: float = reset_timeout
+        self.failures: int = 0
+        self.opened_at: float | None = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow_request(self) -> bool:
+        if self.opened_at is None:
+            return True
+
+        # Half-open state: let one request through and push the next trial further away until it succeeds
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.opened_at = time.monotonic()
+            return True
+
+        return False
+
+    def retry_in(self) -> float:
+        """Seconds until the next trial call is let through, 0 if the circuit is closed."""
+
+        if self.opened_at is None:
+            return 0.0
+        return max(self.opened_at + self.reset_timeout - time.monotonic(), 0.0)
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+class EndpointStats:
+    """Latency and error counters of a single endpoint."""
+
+    def __init__(self) -> None:
+        self.requests: int = 0
+        self.errors: int = 0
+        self.timeouts: int = 0
+        self.throttled: int = 0  # 429 responses
+        self.rejected: int = 0  # Calls that were not made at all because the circuit was open
+        self.latency_total: float = 0.0
+        self.latency_max: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'throttled': self.throttled,
+            'rejected': self.rejected,
+            'latency_avg': self.latency_total / self.requests if self.requests else 0.0,
+            'latency_max': self.latency_max
+        }
+
+
+class ApiClient:
+    """An app-scoped wrapper around a single `aiohttp.ClientSession`, so that connections to the same host are kept
+    alive and reused instead of paying DNS, TCP and TLS setup on every call."""
+
+    CONNECTION_LIMIT: Final[int] = int(os.getenv('HTTP_CONNECTION_LIMIT', 20))
+    KEEPALIVE_TIMEOUT: Final[float] = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', 60.0))
+    DEFAULT_TIMEOUT: Final[float] = float(os.getenv('HTTP_REQUEST_TIMEOUT', 10.0))
+    BREAKER_THRESHOLD: Final[int] = int(os.getenv('HTTP_BREAKER_THRESHOLD', 5))
+    BREAKER_RESET_TIMEOUT: Final[float] = float(os.getenv('HTTP_BREAKER_RESET_TIMEOUT', 30.0))
+
+    def __init__(self) -> None:
+        self.__session: aiohttp.ClientSession | None = None
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.stats: Dict[str, EndpointStats] = {}
+
+    async def open(self) -> None:
+        if self.__session is None:
+            connector = aiohttp.TCPConnector(limit=self.CONNECTION_LIMIT, keepalive_timeout=self.KEEPALIVE_TIMEOUT,
+                                             ttl_dns_cache=300)
+            self.__session = aiohttp.ClientSession(connector=connector,
+                                                   timeout=aiohttp.ClientTimeout(total=self.DEFAULT_TIMEOUT))
+
+    async def close(self) -> None:
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
+
+    async def post_json(self, endpoint: str, url: str, data: Dict, headers: Dict | None = None,
+                        timeout: float | None = None, raise_rate_limited: bool = False) -> Dict | None:
+        """Make a POST-request and return JSON in case of success. `endpoint` is a short name used for the circuit
+        breaker and the counters. Returns None on any failure, including an open circuit or an exceeded deadline.
+        With `raise_rate_limited`, a 429 response raises `RateLimited` instead."""
+
+        breaker = self.breakers.setdefault(endpoint, CircuitBreaker(self.BREAKER_THRESHOLD, self.BREAKER_RESET_TIMEOUT))
+        stats = self.stats.setdefault(endpoint, EndpointStats())
+
+        if not breaker.allow_request():
+            stats.rejected += 1
+            logger.warning('Circuit for %s is open, request skipped', endpoint)
+            return None
+
+        client_timeout = aiohttp.ClientTimeout(total=timeout if timeout is not None else self.DEFAULT_TIMEOUT)
+        start = time.perf_counter()
+        result: Dict | None = None
+        rate_limited: RateLimited | None = None
+        try:
+            async with self.__session.post(url=url, json=data, headers=headers, timeout=client_timeout) as res:
+                if res.status == 200:
+                    result = await res.json()
+                elif res.status == 429:
+                    stats.throttled += 1
+                    retry_after = res.headers.get('Retry-After', '')  # Only the delay-seconds form is used
+                    rate_limited = RateLimited(endpoint, float(retry_after) if retry_after.isdigit() else None)
+                    logger.warning('%s is rate limited', endpoint)
+                else:
+                    logger.warning('%s responded with status %s', endpoint, res.status)
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            logger.warning('%s request timed out', endpoint)
+        except aiohttp.ClientError as e:
+            logger.warning('%s request failed: %r', endpoint, e)
+
+        latency = time.perf_counter() - start
+        stats.requests += 1
+        stats.latency_total += latency
+        stats.latency_max = max(stats.latency_max, latency)
+
+        if result is None:
+            stats.errors += 1
+            # Throttling says nothing about the endpoint being down, so it doesn't open the circuit
+            if rate_limited is None:
+                breaker.record_failure()
+        else:
+            breaker.record_success()
+
+        if rate_limited is not None and raise_rate_limited:
+            raise rate_limited
+        return result
+
+    def retry_in(self, endpoint: str) -> float:
+        """Seconds until calls to `endpoint` are let through again, 0 unless its circuit is open."""
+
+        breaker = self.breakers.get(endpoint)
+        return 0.0 if breaker is None else breaker.retry_in()
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {endpoint: {**stats.as_dict(), 'circuit_open': self.breakers[endpoint].is_open}
+                for endpoint, stats in self.stats.items()}
+
+
+api_client: ApiClient = ApiClient()
+
+
+async def start_api_client(app: web.Application) -> None:
+    """On application start, open the shared HTTP session."""
+
+    await api_client.open()
+
+
+async def cleanup_api_client(app: web.Application) -> None:
+    """Close the shared HTTP session and every kept-alive connection."""
+
+    await api_client.close()
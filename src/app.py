@@ -1,22 +1,51 @@
 """A main module which handles Alice requests at core level and contains all dialog status handlers with most of the
 skill functionality."""
 
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
 import ssl
-from typing import Dict
+import time
+from types import FrameType
+from typing import Dict, Final
 
 from aiohttp import web
 from aiohttp.web_response import Response as AioResponse
 
+import date_resolver
+import deadline
+import json_codec
+from api_client import api_client, start_api_client, cleanup_api_client
 from dialog_manager import (DialogStatus, DialogRequest, DialogResponse, status_handler,
                             get_handler, StatusHandlerType)
 from handlers import new_note, del_note, find_note, list_notes  # Initialise all the handlers
-from summarize import start_scheduler, cleanup_scheduler
+from iam_token import iam_tokens
+from metrics import (REQUEST_PARSE_SECONDS, REQUEST_SECONDS, SERIALIZATION_SECONDS, metrics_handler,
+                     register_stats)
+from note_drafts import draft_buffer, start_draft_buffer, cleanup_draft_buffer
+from note_storage import Database, NoteStorage, start_db_pool, cleanup_db_pool, start_note_cache, cleanup_note_cache
+from summarize import start_scheduler, cleanup_scheduler, cleanup_short_note_flights
+from summary_cache import summary_cache
+from summary_queue import summary_queue, start_summary_queue, cleanup_summary_queue
+
+logger = logging.getLogger(__name__)
 
 
 async def main(request: web.BaseRequest) -> AioResponse:
     """Handles '/' request from Alice."""
 
-    request_data: Dict = await request.json()
+    start = time.perf_counter()
+    token = deadline.start()
+    try:
+        return await respond(request, start)
+    finally:
+        deadline.reset(token)
+
+
+async def respond(request: web.BaseRequest, start: float) -> AioResponse:
+    request_data: Dict = json_codec.loads(await request.read())
 
     # Initialise Request and Response objects
     req: DialogRequest = DialogRequest(request_data)
@@ -24,10 +53,20 @@ async def main(request: web.BaseRequest) -> AioResponse:
 
     res.transfer_persistence(req)
 
+    status = DialogStatus(req.status).name
+    REQUEST_PARSE_SECONDS.observe(time.perf_counter() - start, status)
+
     # Call an appropriate handler for current dialog status
     callback: StatusHandlerType = get_handler(req.status)
     response_data: Dict = await callback(req, res)
-    return web.json_response(response_data)
+
+    serialization_start = time.perf_counter()
+    response: AioResponse = web.Response(body=json_codec.dumps(response_data), content_type='application/json')
+
+    end = time.perf_counter()
+    SERIALIZATION_SECONDS.observe(end - serialization_start, status)
+    REQUEST_SECONDS.observe(end - start, status)
+    return response
 
 
 @status_handler(DialogStatus.IDLE)
@@ -70,13 +109,125 @@ async def what_can_you_do(req: DialogRequest, res: DialogResponse) -> None:
     res.send_message(text)
 
 
-ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-ssl_context.load_cert_chain(certfile='certificate.pem', keyfile='private_key.pem')
-ssl_context.set_ciphers('ECDHE-RSA-AES256-GCM-SHA384:ECDHE-RSA-AES128-GCM-SHA256')
-ssl_context.minimum_version = ssl.TLSVersion.TLSv1_2
+async def ready(request: web.BaseRequest) -> AioResponse:
+    """Handles '/ready' request from the load balancer: only warmed instances should receive traffic."""
+
+    if request.app['ready']:
+        return web.Response(text='ready')
+    return web.Response(status=503, text='warming up')
+
+
+WARM_UP_RETRY_DELAY: Final[float] = 1.0
+WARM_UP_RETRY_MAX_DELAY: Final[float] = 30.0
+
+
+async def warm_up(app: web.Application) -> None:
+    """Pay every one-time cost before the instance reports readiness rather than on the first requests after a
+    deploy. Failures (e.g. the database being briefly unavailable) are retried with backoff until the warm-up succeeds
+    or shutdown cancels it."""
+
+    delay = WARM_UP_RETRY_DELAY
+    while True:
+        try:
+            # In a thread, so that /ready keeps answering meanwhile
+            await asyncio.to_thread(date_resolver.warm_up)
+            await Database.validate()
+            break
+        except Exception:
+            logger.exception('Warm-up failed, retrying in %.0f s', delay)
+
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, WARM_UP_RETRY_MAX_DELAY)
+
+    app['ready'] = True
+
+
+async def start_warm_up(app: web.Application) -> None:
+    """Warm up in the background: aiohttp only starts listening once every startup hook has finished, and /ready must
+    be reachable (answering 503) until the warm-up is done."""
+
+    app['warm_up'] = asyncio.create_task(warm_up(app))
+
 
-app: web.Application = web.Application()
-app.add_routes([web.post('/', main)])
-app.on_startup.append(start_scheduler)
-app.on_cleanup.append(cleanup_scheduler)
-web.run_app(app, port=5000, ssl_context=ssl_context)
+async def stop_accepting(app: web.Application) -> None:
+    """Fail readiness checks during shutdown, so that the load balancer stops routing traffic here."""
+
+    app['warm_up'].cancel()
+    app['ready'] = False
+
+
+def create_app(leader: bool = True) -> web.Application:
+    """Build the skill application with every route and startup/cleanup hook registered. Only the `leader` worker
+    runs the scheduled maintenance jobs."""
+
+    app: web.Application = web.Application()
+    app['ready'] = False
+    app['leader'] = leader
+    app.add_routes([web.post('/', main), web.get('/metrics', metrics_handler), web.get('/ready', ready)])
+    app.on_startup.append(start_db_pool)
+    app.on_startup.append(start_note_cache)
+    app.on_startup.append(start_api_client)
+    app.on_startup.append(start_scheduler)
+    app.on_startup.append(start_summary_queue)
+    app.on_startup.append(start_draft_buffer)
+    app.on_startup.append(start_warm_up)
+    app.on_shutdown.append(stop_accepting)
+    app.on_cleanup.append(cleanup_scheduler)
+    app.on_cleanup.append(cleanup_summary_queue)
+    app.on_cleanup.append(cleanup_short_note_flights)
+    app.on_cleanup.append(cleanup_draft_buffer)
+    app.on_cleanup.append(cleanup_api_client)
+    app.on_cleanup.append(cleanup_note_cache)
+    app.on_cleanup.append(cleanup_db_pool)
+
+    register_stats('db_pool', Database.stats)
+    register_stats('note_cache', NoteStorage.cache.stats)
+    register_stats('http_client', api_client.get_stats, label='endpoint')
+    register_stats('summary_queue', summary_queue.stats)
+    register_stats('summary_cache', summary_cache.stats)
+    register_stats('iam_token', iam_tokens.stats)
+    register_stats('note_drafts', draft_buffer.stats)
+    return app
+
+
+def run_worker(worker_id: int, reuse_port: bool) -> None:
+    """Serve the skill in the current process. Worker 0 is the leader."""
+
+    ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    ssl_context.load_cert_chain(certfile='certificate.pem', keyfile='private_key.pem')
+    ssl_context.set_ciphers('ECDHE-RSA-AES256-GCM-SHA384:ECDHE-RSA-AES128-GCM-SHA256')
+    ssl_context.minimum_version = ssl.TLSVersion.TLSv1_2
+
+    # On SIGTERM, run_app stops accepting connections, waits for in-flight requests and runs the cleanup hooks,
+    # which drain background summarization
+    web.run_app(create_app(leader=worker_id == 0), port=5000, ssl_context=ssl_context, reuse_port=reuse_port)
+
+
+def run_workers(count: int) -> None:
+    """Serve the skill in `count` processes sharing port 5000 through SO_REUSEPORT, so that every core is used."""
+
+    processes = [multiprocessing.Process(target=run_worker, args=(worker_id, True), name=f'worker-{worker_id}')
+                 for worker_id in range(count)]
+    for process in processes:
+        process.start()
+
+    def stop(signum: int, frame: FrameType | None) -> None:
+        for p in processes:
+            if p.is_alive():
+                p.terminate()  # SIGTERM, i.e. a graceful shutdown of the worker
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    # 0 means one worker per CPU core
+    workers: int = int(os.getenv('WEB_WORKERS', 1)) or os.cpu_count()
+
+    if workers == 1:
+        run_worker(0, reuse_port=False)
+    else:
+        run_workers(workers)
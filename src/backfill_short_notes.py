@@ -0,0 +1,278 @@
+"""Admin CLI which creates the missing short forms of existing notes, resuming from a checkpoint file if interrupted:
+
+    python src/backfill_short_notes.py --max-concurrency 64 --checkpoint /var/tmp/backfill.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Deque, Final, List, Tuple
+
+import asyncpg
+
+from api_client import RateLimited, api_client
+from note_storage import Database
+from reporting import Progress
+from summarize import COMPLETION_ENDPOINT, COMPLETION_TIMEOUT, request_completion, summary_key
+from summary_cache import summary_cache
+
+PAGE_SIZE: Final[int] = 200
+PAGES_IN_FLIGHT: Final[int] = 2  # The next page is being summarized while the previous one is finishing
+RETRIES: Final[int] = 5  # Of a single note within a pass
+PASSES: Final[int] = 3
+RETRY_DELAY: Final[float] = 1.0  # Used unless the API says how long to wait, doubled on every retry
+
+Key = Tuple[str, int]  # (user_id, id), the primary key of `user_notes`
+FIRST_KEY: Final[Key] = ('', 0)
+Page = Tuple[Key, List[asyncpg.Record], List[asyncio.Task]]
+
+SCAN_QUERY: Final[str] = ('SELECT user_id, id, full_note FROM user_notes '
+                          "WHERE short_note IS NULL AND full_note <> '' AND (user_id, id) > ($1, $2) "
+                          'ORDER BY user_id, id LIMIT $3')
+
+# A note may have got its short form from the skill in the meantime, which is kept then
+UPDATE_QUERY: Final[str] = ('UPDATE user_notes AS note SET short_note = new.short_note '
+                            'FROM unnest($1::varchar[], $2::bigint[], $3::varchar[]) AS new (user_id, id, short_note) '
+                            'WHERE note.user_id = new.user_id AND note.id = new.id AND note.short_note IS NULL')
+
+
+class AimdLimiter:
+    """Limits the number of calls in flight, adjusting the limit by additive increase / multiplicative decrease:
+    every call which finishes within `target_latency` adds 1/limit (that is, about one per round of calls), while a
+    slow, failed or throttled call multiplies the limit by `DECREASE_FACTOR`."""
+
+    DECREASE_FACTOR: Final[float] = 0.5
+
+    def __init__(self, initial: int, minimum: int, maximum: int, target_latency: float) -> None:
+        self.minimum: int = minimum
+        self.maximum: int = maximum
+        self.target_latency: float = target_latency
+        self.limit: float = float(min(max(initial, minimum), maximum))
+        self.in_flight: int = 0
+
+        self.__changed: asyncio.Condition = asyncio.Condition()
+        self.__decreased_at: float = 0.0
+
+    async def acquire(self) -> None:
+        async with self.__changed:
+            await self.__changed.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, latency: float | None = None, congested: bool = False) -> None:
+        """Give the slot back. A `congested` call decreases the limit, and `latency` of a completed one adjusts it.
+        A call which was given up for other reasons (e.g. cancelled) leaves the limit as is."""
+
+        async with self.__changed:
+            self.in_flight -= 1
+            if congested or (latency is not None and latency > self.target_latency):
+                self.__decrease()
+            elif latency is not None:
+                self.limit = min(self.limit + 1 / self.limit, self.maximum)
+            self.__changed.notify_all()
+
+    def __decrease(self) -> None:
+        # The calls which were already in flight report the same congestion, so it's reacted to once per round
+        now = time.monotonic()
+        if now - self.__decreased_at < self.target_latency:
+            return
+
+        self.__decreased_at = now
+        self.limit = max(self.limit * self.DECREASE_FACTOR, self.minimum)
+
+
+class Checkpoint:
+    """The key in front of which every note has been processed, kept in a JSON file."""
+
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+
+    def load(self) -> Key | None:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+
+        return data['user_id'], data['id']
+
+    def save(self, key: Key) -> None:
+        # Written aside and renamed, so that a crash never leaves a half-written checkpoint behind
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump({'user_id': key[0], 'id': key[1]}, f)
+        os.replace(temporary, self.path)
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def note_key(note: asyncpg.Record) -> Key:
+    return note['user_id'], note['id']
+
+
+async def wait_for_circuit() -> None:
+    """Sleep while the circuit of YandexGPT is open, as every call would be rejected right away."""
+
+    delay = api_client.retry_in(COMPLETION_ENDPOINT)
+    while delay > 0:
+        await asyncio.sleep(delay)
+        delay = api_client.retry_in(COMPLETION_ENDPOINT)
+
+
+async def summarize_note(text: str, limiter: AimdLimiter, progress: Progress) -> str | None:
+    """Summarize a single note, taking it from the summary cache if possible. YandexGPT calls are made within the
+    concurrency limit and retried, with a growing delay, after failures and throttling."""
+
+    key = summary_key(text)
+    cached: str | None = await summary_cache.get(key)
+    if cached is not None:
+        progress.counts['cached'] += 1
+        return cached
+
+    failures = 0
+    while failures <= RETRIES:
+        await wait_for_circuit()
+        await limiter.acquire()
+        start = time.perf_counter()
+        retry_after: float | None = None
+        try:
+            result: str | None = await request_completion(text, raise_rate_limited=True)
+        except RateLimited as e:
+            progress.counts['throttled'] += 1
+            result, retry_after = None, e.retry_after
+        except BaseException:
+            await limiter.release()
+            raise
+
+        if result is not None:
+            await limiter.release(time.perf_counter() - start)
+            await summary_cache.put(key, result)
+            return result
+
+        # Timeouts, 5xx and 429 alike mean that YandexGPT is overloaded
+        await limiter.release(congested=True)
+
+        # Calls rejected by an open circuit are not this note's failures, they are made again once it closes
+        if api_client.retry_in(COMPLETION_ENDPOINT) == 0:
+            await asyncio.sleep(retry_after or RETRY_DELAY * 2 ** failures)
+            failures += 1
+
+    return None
+
+
+class Backfill:
+    """Passes over the notes without a short form, keeping up to `PAGES_IN_FLIGHT` pages in flight. Pages are written
+    back in scan order, and the checkpoint never moves past a note which could not be summarized."""
+
+    def __init__(self, conn: asyncpg.Connection, checkpoint: Checkpoint, limiter: AimdLimiter,
+                 page_size: int) -> None:
+        self.conn: asyncpg.Connection = conn
+        self.checkpoint: Checkpoint = checkpoint
+        self.limiter: AimdLimiter = limiter
+        self.page_size: int = page_size
+        self.progress: Progress = Progress('scanned')
+        self.progress.counts = {'cached': 0, 'updated': 0, 'failed': 0, 'throttled': 0}
+
+        self.__retry_from: Key | None = None
+
+    async def scan(self, after: Key) -> Key | None:
+        """A single pass over the notes after `after`. Returns the key to rescan from if some of them failed."""
+
+        self.__retry_from = None
+        pages: Deque[Page] = deque()
+        exhausted = False
+
+        try:
+            while not exhausted or pages:
+                if not exhausted:
+                    notes: List[asyncpg.Record] = await self.conn.fetch(SCAN_QUERY, *after, self.page_size)
+                    exhausted = len(notes) < self.page_size
+                    if notes:
+                        tasks = [asyncio.create_task(summarize_note(note['full_note'], self.limiter, self.progress))
+                                 for note in notes]
+                        pages.append((after, notes, tasks))
+                        after = note_key(notes[-1])
+
+                if pages and (exhausted or len(pages) >= PAGES_IN_FLIGHT):
+                    await self.__write(pages.popleft())
+                    self.report(end='')
+        finally:
+            for _, _, tasks in pages:
+                for task in tasks:
+                    task.cancel()
+
+        return self.__retry_from
+
+    def report(self, end: str = '\n') -> None:
+        self.progress.counts['concurrency'] = round(self.limiter.limit, 1)
+        self.progress.report(end)
+
+    async def __write(self, page: Page) -> None:
+        """Wait for every note of the page and write their short forms with a single UPDATE."""
+
+        after, notes, tasks = page
+        results: List[str | None] = await asyncio.gather(*tasks)
+        done = [(note, result) for note, result in zip(notes, results) if result is not None]
+
+        if done:
+            status = await self.conn.execute(UPDATE_QUERY, [note['user_id'] for note, _ in done],
+                                             [note['id'] for note, _ in done], [result for _, result in done])
+            self.progress.counts['updated'] += int(status.rsplit(' ', 1)[-1])
+
+        self.progress.rows += len(notes)
+        self.progress.counts['failed'] += len(notes) - len(done)
+
+        # Once a note has failed, the checkpoint stays in front of it for the rest of the pass
+        if self.__retry_from is not None:
+            return
+
+        failed = next((i for i, result in enumerate(results) if result is None), None)
+        if failed is None:
+            self.checkpoint.save(note_key(notes[-1]))
+        else:
+            self.__retry_from = after if failed == 0 else note_key(notes[failed - 1])
+            self.checkpoint.save(self.__retry_from)
+
+
+async def run(args: argparse.Namespace) -> None:
+    checkpoint = Checkpoint(args.checkpoint)
+    if args.restart:
+        checkpoint.clear()
+
+    limiter = AimdLimiter(args.initial_concurrency, args.min_concurrency, args.max_concurrency, args.target_latency)
+    after: Key = checkpoint.load() or FIRST_KEY
+
+    # The pool serves the summary cache, while the scan and the updates have a connection of their own
+    await Database.open()
+    await api_client.open()
+    conn: asyncpg.Connection = await asyncpg.connect(command_timeout=None)
+    backfill = Backfill(conn, checkpoint, limiter, args.page_size)
+    try:
+        # Every further pass rescans from the first note which has failed in the previous one
+        for _ in range(args.passes):
+            after = await backfill.scan(after)
+            if after is None:
+                break
+    finally:
+        backfill.report()
+        await conn.close()
+        await api_client.close()
+        await Database.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--checkpoint', default='backfill_short_notes.json', help='file to keep the position in')
+    parser.add_argument('--restart', action='store_true', help='ignore the checkpoint and scan from the beginning')
+    parser.add_argument('--passes', type=int, default=PASSES, help='passes to make while some notes keep failing')
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE, help='notes scanned and updated at a time')
+    parser.add_argument('--initial-concurrency', type=int, default=4, help='YandexGPT calls in flight to begin with')
+    parser.add_argument('--min-concurrency', type=int, default=1)
+    parser.add_argument('--max-concurrency', type=int, default=32)
+    parser.add_argument('--target-latency', type=float, default=COMPLETION_TIMEOUT / 4,
+                        help='seconds per call above which the concurrency is decreased')
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,142 @@
+"""Resolution of user-provided dates. NLU entities are used first, then a fast path for the most common Russian forms,
+and only then dateparser, restricted to Russian. Parsed strings are cached for the current day."""
+
+import calendar
+import datetime
+import functools
+import os
+import re
+from typing import Dict, Final, List
+
+from dateparser.date import DateDataParser
+
+from dialog_manager import DialogRequest, EntityDatetime, NLUEntity
+
+MONTHS: Final[List[str]] = ['января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
+                            'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря']
+MONTH_NUMBERS: Final[Dict[str, int]] = {name: i for i, name in enumerate(MONTHS, start=1)}
+
+RELATIVE_DAYS: Final[Dict[str, int]] = {'сегодня': 0, 'вчера': -1, 'позавчера': -2, 'завтра': 1, 'послезавтра': 2}
+
+CACHE_SIZE: Final[int] = int(os.getenv('DATE_CACHE_SIZE', 1024))
+
+_PREPOSITION = re.compile(r'^(?:за|от|на)\s+')
+_DAY_MONTH = re.compile(r'^(\d{1,2})\s+(' + '|'.join(MONTHS) + r')(?:\s+(\d{4})(?:\s+(?:года|год|г\.?))?)?$')
+_NUMERIC = re.compile(r'^(\d{1,2})\.(\d{1,2})(?:\.(\d{2}|\d{4}))?$')
+_ISO = re.compile(r'^(\d{4})-(\d{2})-(\d{2})$')
+_DAYS_AGO = re.compile(r'^(\d{1,3})\s+(?:день|дня|дней)\s+назад$')
+
+_parser: DateDataParser | None = None
+
+
+def get_parser() -> DateDataParser:
+    """A single dateparser instance restricted to Russian, so that neither language detection nor loading other
+    locales happens on requests."""
+
+    global _parser
+    if _parser is None:
+        _parser = DateDataParser(languages=['ru'])
+    return _parser
+
+
+def warm_up() -> None:
+    """Load dateparser's Russian locale data now rather than on the first date turn."""
+
+    get_parser().get_date_data('в прошлый понедельник')
+
+
+def _make_date(year: int, month: int, day: int) -> datetime.date | None:
+    try:
+        return datetime.date(year, month, day)
+    except ValueError:
+        return None
+
+
+def from_entity(entity: EntityDatetime, today: datetime.date) -> datetime.date | None:
+    """Turn a YANDEX.DATETIME entity into a date. Returns None if the entity doesn't point to a specific day."""
+
+    if entity.day is None:
+        return None
+
+    year, month = today.year, today.month
+    if entity.year is not None:
+        year = year + entity.year if 'year' in entity.relative else entity.year
+
+    if entity.month is not None:
+        if 'month' in entity.relative:
+            year, month = divmod(year * 12 + month - 1 + entity.month, 12)
+            month += 1
+        else:
+            month = entity.month
+
+    if 'day' in entity.relative:
+        base = _make_date(year, month, min(today.day, calendar.monthrange(year, month)[1]))
+        return base + datetime.timedelta(days=entity.day) if base is not None else None
+
+    return _make_date(year, month, entity.day)
+
+
+def _fast_path(text: str, today: datetime.date) -> datetime.date | None:
+    if text in RELATIVE_DAYS:
+        return today + datetime.timedelta(days=RELATIVE_DAYS[text])
+
+    if match := _DAY_MONTH.match(text):
+        year = int(match[3]) if match[3] else today.year
+        return _make_date(year, MONTH_NUMBERS[match[2]], int(match[1]))
+
+    if match := _NUMERIC.match(text):
+        year = today.year
+        if match[3]:
+            year = int(match[3]) if len(match[3]) == 4 else 2000 + int(match[3])
+        return _make_date(year, int(match[2]), int(match[1]))
+
+    if match := _ISO.match(text):
+        return _make_date(int(match[1]), int(match[2]), int(match[3]))
+
+    if match := _DAYS_AGO.match(text):
+        return today - datetime.timedelta(days=int(match[1]))
+
+    return None
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _resolve_string(text: str, today: datetime.date) -> datetime.date | None:
+    # `today` is a part of the cache key, so that relative dates like "вчера" are not reused on the following day
+    text = _PREPOSITION.sub('', text.strip().lower())
+
+    date = _fast_path(text, today)
+    if date is not None:
+        return date
+
+    date_obj = get_parser().get_date_data(text).date_obj
+    return date_obj.date() if date_obj is not None else None
+
+
+def resolve_date(text: str, entity: NLUEntity | None = None) -> datetime.date | None:
+    """Return the date the user has mentioned, or None if it cannot be recognized. `entity` is the NLU entity
+    covering `text`, if there is one."""
+
+    today = datetime.date.today()
+
+    if isinstance(entity, EntityDatetime):
+        date = from_entity(entity, today)
+        if date is not None:
+            return date
+
+    return _resolve_string(text, today)
+
+
+def find_datetime_entity(req: DialogRequest, slot: NLUEntity | None = None) -> EntityDatetime | None:
+    """Find a YANDEX.DATETIME entity in the request: the slot itself, one covering the same tokens as the slot or,
+    if there is no slot, the first one recognized in the utterance."""
+
+    if isinstance(slot, EntityDatetime):
+        return slot
+
+    for entity in req.nlu.entities:
+        if not isinstance(entity, EntityDatetime):
+            continue
+        if slot is None or (entity.start_token >= slot.start_token and entity.end_token <= slot.end_token):
+            return entity
+
+    return None
@@ -0,0 +1,53 @@
+"""Request-scoped deadlines. Alice drops webhook responses after about 3 seconds, so `app.main` gives every request a
+time budget, and everything the request awaits (database queries, waiting for short forms or draft chunks) is limited
+to what is left of it. Code running outside of a request, like background jobs, has no deadline."""
+
+import asyncio
+import contextvars
+import os
+import time
+from contextvars import ContextVar, Token
+from typing import Coroutine, Final
+
+REQUEST_BUDGET: Final[float] = float(os.getenv('REQUEST_DEADLINE', 2.5))  # Leaves time to send the response itself
+
+_deadline: ContextVar[float | None] = ContextVar('request_deadline', default=None)
+
+
+def start(budget: float = REQUEST_BUDGET) -> Token:
+    """Set the deadline of the current request `budget` seconds from now."""
+
+    return _deadline.set(time.monotonic() + budget)
+
+
+def reset(token: Token) -> None:
+    _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """Seconds left until the deadline, or None outside of a request."""
+
+    deadline = _deadline.get()
+    return None if deadline is None else max(deadline - time.monotonic(), 0.0)
+
+
+def limit(timeout: float | None = None) -> float | None:
+    """Shorten `timeout` (None meaning no timeout of its own) to the time left until the deadline. Raises
+    `asyncio.TimeoutError` right away if the deadline has already passed."""
+
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise asyncio.TimeoutError
+
+    return left if timeout is None else min(timeout, left)
+
+
+def detached_task(coro: Coroutine) -> asyncio.Task:
+    """Create a task which is not bound by the current request's deadline, for work which must outlive the request.
+    A plain `asyncio.create_task` would inherit the deadline along with the rest of the context."""
+
+    context = contextvars.copy_context()
+    context.run(_deadline.set, None)
+    return context.run(asyncio.create_task, coro)
@@ -1,8 +1,12 @@
 """This package provides a convenient wrapper for Alice requests/responses
 by utilizing our own DialogStatus-system (BETA)."""
 
-from typing import Awaitable, Callable, Dict
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Final
 
+import deadline
+from metrics import DEADLINE_EXCEEDED, HANDLER_ERRORS, HANDLER_SECONDS
 from .request import DialogRequest
 from .response import DialogResponse
 from .status import DialogStatus
@@ -12,17 +16,45 @@ StatusHandlerType = Callable[[DialogRequest, DialogResponse], Awaitable[Dict | N
 
 CALLBACKS: Dict[DialogStatus, StatusHandlerType] = {}
 
+DEADLINE_MESSAGE: Final[str] = 'Что-то я задумалась и не успела ответить. Попробуйте ещё раз, пожалуйста.'
+
+
+def deadline_response(req: DialogRequest) -> DialogResponse:
+    """A response for a request which ran out of time. It leaves the session exactly as the request found it, so that
+    repeating the same phrase picks the dialog up where it was."""
+
+    res = DialogResponse()
+    res.transfer_persistence(req)
+    res.send_user_data(req.user_data or {})
+    res.send_status(req.session_status)
+    res.send_message(DEADLINE_MESSAGE)
+    return res
+
 
 def status_handler(status_id: DialogStatus) -> Callable:
     """Register given function as a callback for a certain dialog status,
     as well as make it provide flask-friendly json output automatically.
     Decorated functions must take Request and Response as their arguments.
+    If a handler doesn't finish by the request's deadline, it is cancelled and `deadline_response` is sent instead.
     """
 
+    status_label = DialogStatus(status_id).name
+
     def inner(func: StatusHandlerType) -> StatusHandlerType:
         async def wrapper(req: DialogRequest, res: DialogResponse) -> Dict:
-            await func(req, res)
-            return res.json
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(func(req, res), deadline.remaining())
+                return res.json
+            except asyncio.TimeoutError:
+                # Either the whole handler or something it has awaited (e.g. a query) has run out of time
+                DEADLINE_EXCEEDED.inc(status_label)
+                return deadline_response(req).json
+            except Exception:
+                HANDLER_ERRORS.inc(status_label)
+                raise
+            finally:
+                HANDLER_SECONDS.observe(time.perf_counter() - start, status_label)
 
         CALLBACKS[status_id] = wrapper
         return wrapper
@@ -1,10 +1,11 @@
-from dataclasses import dataclass
 from typing import Optional, Dict, List, Any
 
 
 class NLUEntity:
     TYPE: Optional[str]
 
+    __slots__ = ('start_token', 'end_token', 'value')
+
     def __init__(self, start_token, end_token, value):
         self.start_token: int = start_token
         self.end_token: int = end_token
@@ -14,6 +15,8 @@ class NLUEntity:
 class EntityDatetime(NLUEntity):
     TYPE = 'YANDEX.DATETIME'
 
+    __slots__ = ('year', 'month', 'day', 'hour', 'minute', 'relative')
+
     def __init__(self, start_token, end_token, value):
         super().__init__(start_token, end_token, value)
 
@@ -32,6 +35,8 @@ class EntityDatetime(NLUEntity):
 class EntityFIO(NLUEntity):
     TYPE = 'YANDEX.FIO'
 
+    __slots__ = ('first_name', 'patronymic_name', 'last_name')
+
     def __init__(self, start_token, end_token, value):
         super().__init__(start_token, end_token, value)
 
@@ -43,6 +48,8 @@ class EntityFIO(NLUEntity):
 class EntityGEO(NLUEntity):
     TYPE = 'YANDEX.GEO'
 
+    __slots__ = ('country', 'city', 'street', 'house_number', 'airport')
+
     def __init__(self, start_token, end_token, value):
         super().__init__(start_token, end_token, value)
 
@@ -56,31 +63,60 @@ class EntityGEO(NLUEntity):
 class EntityString(NLUEntity):
     TYPE = 'YANDEX.STRING'
 
-    def __init__(self, start_token, end_token, value):
-        super().__init__(start_token, end_token, value)
+    __slots__ = ()
 
 
 class EntityNumber(NLUEntity):
     TYPE = 'YANDEX.NUMBER'
 
-    def __init__(self, start_token, end_token, value):
-        super().__init__(start_token, end_token, value)
+    __slots__ = ()
 
 
-@dataclass
 class Intent:
     """Распознанная в пользовательской реплике задача. Содержит слоты, которые хранят информацию
-    об отдельных смысловых частях этой задачи."""
+    об отдельных смысловых частях этой задачи. Сущности слотов создаются только при первом обращении к ним."""
+
+    __slots__ = ('name', '__slots_json', '__slots')
+
+    def __init__(self, name: str, slots_json: Dict[str, Any]) -> None:
+        self.name: str = name
+        self.__slots_json: Dict[str, Any] = slots_json
+        self.__slots: Dict[str, NLUEntity] | None = None
+
+    @property
+    def slots(self) -> Dict[str, NLUEntity]:
+        if self.__slots is None:
+            self.__slots = {key: NLUFactory.make_entity(value) for key, value in self.__slots_json.items()}
 
-    name: str
-    slots: Dict[str, NLUEntity]
+        return self.__slots
 
 
-@dataclass
 class NLU:
-    tokens: List[str]
-    entities: List[NLUEntity]
-    intents: Dict[str, Intent]
+    """A view of the NLU part of a request. Most handlers only check intent names, so intents and entities
+    are built from the raw json only when they are accessed for the first time."""
+
+    __slots__ = ('tokens', '__json', '__entities', '__intents')
+
+    def __init__(self, nlu_json: Dict[str, Any]) -> None:
+        self.tokens: List[str] = nlu_json['tokens']
+        self.__json: Dict[str, Any] = nlu_json
+        self.__entities: List[NLUEntity] | None = None
+        self.__intents: Dict[str, Intent] | None = None
+
+    @property
+    def entities(self) -> List[NLUEntity]:
+        if self.__entities is None:
+            self.__entities = [NLUFactory.make_entity(entity_json) for entity_json in self.__json['entities']]
+
+        return self.__entities
+
+    @property
+    def intents(self) -> Dict[str, Intent]:
+        if self.__intents is None:
+            self.__intents = {intent_name: Intent(intent_name, intent_json['slots'])
+                              for intent_name, intent_json in self.__json['intents'].items()}
+
+        return self.__intents
 
 
 class NLUFactory:
@@ -89,22 +125,7 @@ class NLUFactory:
 
     @classmethod
     def construct(cls, nlu_json: Dict[str, Any]) -> NLU:
-        tokens: List[str] = nlu_json['tokens']
-
-        entities: List[NLUEntity] = []
-        for entity_json in nlu_json['entities']:
-            entity = cls.make_entity(entity_json)
-            entities.append(entity)
-
-        intents: Dict[str, Intent] = {}
-        for intent_name, intent_json in nlu_json['intents'].items():
-            slot_entities = {}
-            for key, value in intent_json['slots'].items():
-                slot_entities[key] = cls.make_entity(value)
-
-            intents[intent_name] = Intent(intent_name, slot_entities)
-
-        return NLU(tokens, entities, intents)
+        return NLU(nlu_json)
 
     @classmethod
     def make_entity(cls, entity_json: Dict[str, Any]) -> NLUEntity:
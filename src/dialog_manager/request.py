@@ -40,6 +40,10 @@ class DialogRequest:
             self.status = self.__request_storage['dialog_status']
             self.persistence = self.__request_storage['persistence']
 
+        # The status the session is in, before any intent below replaces it. A request which fails to complete
+        # leaves the session in this status, so that the user can simply repeat themselves
+        self.session_status: DialogStatus = DialogStatus(self.status)
+
         self.exit_current_status: bool = False
 
         # 'exit' is a special intent which interrupts any dialog process and sets the status back to IDLE
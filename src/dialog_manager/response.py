@@ -1,10 +1,18 @@
 """A module implementing DialogResponse class."""
 
-from typing import Any, Dict
+from typing import Any, Dict, Final
 
+import json_codec
 from .status import DialogStatus
 from .request import DialogRequest
 
+# Buttons suggested to the user whenever the dialog returns to IDLE. Built once and shared by every response,
+# hence immutable: pre-encoded with orjson, read-only otherwise
+IDLE_BUTTONS: Final[Any] = json_codec.fragment([
+    {'title': title, 'hide': True}
+    for title in ('Создать запись', 'Удалить запись', 'Мои записи', 'Посмотреть запись')
+])
+
 
 class DialogResponse:
     """A class that provides interface for making correct responses to Alice."""
@@ -14,13 +22,10 @@ class DialogResponse:
         self.__response_storage: Dict[str, Any] = \
             {'dialog_status': DialogStatus.IDLE, 'persistence': [], 'user_data': {}}
 
-        self.__full_response: Dict[str, Any] = {
-            'response': {
-                'text': '',
-                'end_session': False
-            },
-            'session_state': None,  # Substitute with _response_user_data directly before returning final response
-            'version': '1.0'
+        # The final payload is assembled around this dict only once, see `json`
+        self.__response: Dict[str, Any] = {
+            'text': '',
+            'end_session': False
         }
 
     def transfer_persistence(self, req: DialogRequest) -> None:
@@ -73,10 +78,10 @@ class DialogResponse:
             raise ValueError('Cannot send empty string.')
 
         # If there are multiple strings to send, we simply stack them together with '\n'
-        if len(self.__full_response['response']['text']) == 0:
-            self.__full_response['response']['text'] = text
+        if len(self.__response['text']) == 0:
+            self.__response['text'] = text
         else:
-            self.__full_response['response']['text'] += '\n' + text
+            self.__response['text'] += '\n' + text
 
     def send_tts(self, tts: str) -> None:
         # Explicit type casting is required in order to execute len() and concatenation below
@@ -87,37 +92,23 @@ class DialogResponse:
             raise ValueError('Cannot send empty string.')
 
         # If there are multiple strings to send, we simply stack them together with '\n'
-        if 'tts' not in self.__full_response['response']:
-            self.__full_response['response']['tts'] = tts
+        if 'tts' not in self.__response:
+            self.__response['tts'] = tts
         else:
-            self.__full_response['response']['tts'] += '\n' + tts
+            self.__response['tts'] += '\n' + tts
 
     @property
     def json(self) -> Dict[str, Any]:
-        # Copying is necessary to prevent original data from unsafe modification
-        response = self.__full_response.copy()
-        response['session_state'] = self.__response_storage.copy()
+        """Final response payload. It shares its nested dicts with this object instead of copying them, so it is meant
+        to be serialized right away with `json_codec.dumps` rather than modified."""
 
+        response = self.__response
         if self.__response_storage['dialog_status'] == DialogStatus.IDLE:
-            buttons = [
-                {
-                    "title": "Создать запись",
-                    "hide": True
-                },
-                {
-                    "title": "Удалить запись",
-                    "hide": True
-                },
-                {
-                    "title": "Мои записи",
-                    "hide": True
-                },
-                {
-                    "title": "Посмотреть запись",
-                    "hide": True
-                },
-            ]
-
-            response['response']['buttons'] = buttons
-
-        return response
+            # A new dict on top of the original one, so that it remains untouched
+            response = {**response, 'buttons': IDLE_BUTTONS}
+
+        return {
+            'response': response,
+            'session_state': self.__response_storage,
+            'version': '1.0'
+        }
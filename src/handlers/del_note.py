@@ -1,26 +1,33 @@
 import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from asyncpg import Record
 
+from date_resolver import find_datetime_entity
 from dialog_manager import DialogRequest, DialogResponse, DialogStatus, status_handler, Intent, EntityString
 from note_storage import NoteStorage
-from util import send_date_list, parse_date
+from util import send_date_list, send_suggestions, parse_date, note_ids_by_date
 
 
 async def deletion_attempt_by_title(req: DialogRequest, res: DialogResponse, title: str):
     async with NoteStorage(req.user_id) as db:
-        notes: List[Record] = await db.select_notes(title)
-
-        if len(notes) == 1:  # If title is unique, simply delete the corresponding note
-            await db.delete_notes(title)
-            res.send_message('Запись успешно удалена!')
-        elif len(notes) > 1:  # If there are few notes with the same title, ask user to specify the date
-            res.send_status(DialogStatus.DEL_NOTE_DATE_INPUT)
-            res.send_user_data({'title': title})
-            send_date_list(res, notes)
-        else:
-            res.send_message('У вас нет записи с таким названием.')
+        notes: List[Record] = await db.delete_notes(title, guarded=True)
+
+        # Similar titles are only suggested: deleting a note the user hasn't named exactly is too risky
+        candidates: List[Record] = await db.search_notes(title) if len(notes) == 0 else []
+
+    if len(notes) == 1:  # If title is unique, the corresponding note has been deleted straight away
+        res.send_message('Запись успешно удалена!')
+    elif len(notes) > 1:  # If there are few notes with the same title, ask user to specify the date
+        res.send_status(DialogStatus.DEL_NOTE_DATE_INPUT)
+        res.send_user_data({'title': title, 'notes': note_ids_by_date(notes)})
+        send_date_list(res, notes)
+    elif len(candidates) != 0:
+        res.send_message('У вас нет записи с таким названием.')
+        send_suggestions(res, candidates)
+        res.send_status(DialogStatus.DEL_NOTE_TITLE_INPUT)
+    else:
+        res.send_message('У вас нет записи с таким названием.')
 
 
 @status_handler(DialogStatus.DEL_NOTE)
@@ -34,18 +41,18 @@ async def del_note(req: DialogRequest, res: DialogResponse) -> None:
 
     if title is not None and date is not None:
         date_str = ' '.join(req.nlu.tokens[date.start_token:date.end_token])
-        date_object = parse_date(res, date_str)
+        date_object = parse_date(res, date_str, find_datetime_entity(req, date))
 
         if date_object is None:
             return
 
         async with NoteStorage(req.user_id) as db:
-            note = await db.select_notes(title_str, date_object)
-            if len(note) != 0:
-                await db.delete_notes(title_str, date_object)
-                res.send_message('Запись успешно удалена!')
-            else:
-                res.send_message('Извините, не нашёл такой заметки. Попробуйте снова.')
+            note: List[Record] = await db.delete_notes(title_str, date_object, guarded=True)
+
+        if len(note) != 0:
+            res.send_message('Запись успешно удалена!')
+        else:
+            res.send_message('Извините, не нашёл такой заметки. Попробуйте снова.')
     elif title is not None:
         await deletion_attempt_by_title(req, res, title_str)
     else:
@@ -63,12 +70,22 @@ async def del_note_title_input(req: DialogRequest, res: DialogResponse) -> None:
 @status_handler(DialogStatus.DEL_NOTE_DATE_INPUT)
 async def del_note_date_input(req: DialogRequest, res: DialogResponse) -> None:
     title: str = req.user_data['title']
-    date: datetime.date = parse_date(res, req.command)
+    notes: Dict[str, int] = req.user_data['notes']
+    date: datetime.date = parse_date(res, req.command, find_datetime_entity(req))
 
     if date is None:
         return
 
-    async with NoteStorage(req.user_id) as db:
-        await db.delete_notes(title, date)
+    # The candidates have been listed on the previous turn, so the note is deleted by its id
+    note_id: int | None = notes.get(date.isoformat())
+    deleted = False
+    if note_id is not None:
+        async with NoteStorage(req.user_id) as db:
+            deleted = await db.delete_note(note_id)
 
-    res.send_message('Запись успешно удалена!')
+    if deleted:
+        res.send_message('Запись успешно удалена!')
+    else:
+        res.send_message('Упс! По указанной дате ничего не нашлось. Попробуете ещё раз?')
+        res.send_user_data({'title': title, 'notes': notes})
+        res.send_status(DialogStatus.DEL_NOTE_DATE_INPUT)
@@ -1,27 +1,37 @@
-from datetime import datetime
+import datetime
 from typing import List, Optional
 
 from asyncpg import Record
 
+from date_resolver import find_datetime_entity
 from dialog_manager import DialogRequest, DialogResponse, DialogStatus, Intent, status_handler, EntityString
 from note_storage import NoteStorage
-from util import send_date_list, parse_date
+from summarize import SHORT_NOTE_MODE, request_short_note
+from summary_queue import summary_queue
+from util import send_date_list, send_suggestions, parse_date, note_ids_by_date
 
 
 async def search_attempt_by_title(req: DialogRequest, res: DialogResponse, title: str):
     async with NoteStorage(req.user_id) as db:
         notes: List[Record] = await db.select_notes(title)
 
+        # Speech recognition often gets a word or two of the title wrong, so similar titles are looked up as well
+        candidates: List[Record] = await db.search_notes(title) if len(notes) == 0 else []
+
     if len(notes) == 1:  # If there is only one note, send it back to user
         ask_note_form(res)
+        res.send_user_data({'note_id': notes[0]['id']})
     elif len(notes) > 1:  # If there are few notes with the same title, ask user to specify the date
         send_date_list(res, notes)
         res.send_status(DialogStatus.FIND_NOTE_DATE_INPUT)
+        res.send_user_data({'title': title, 'notes': note_ids_by_date(notes)})
+    elif len(candidates) != 0:
+        res.send_message('Нет записи с таким названием.')
+        send_suggestions(res, candidates)
+        res.send_status(DialogStatus.FIND_NOTE_TITLE_INPUT)
     else:
         res.send_message('Нет записи с таким названием.')
 
-    res.send_user_data({'title': title})
-
 
 def ask_note_form(res: DialogResponse) -> None:
     res.send_message('Для удобства могу сократить заметку и пересказать самые важные моменты. '
@@ -38,7 +48,8 @@ async def find_note(req: DialogRequest, res: DialogResponse) -> None:
 
     if title is not None and date is not None:
         # Checking if date is correct
-        date_object = parse_date(res, date.value)
+        date_str = ' '.join(req.nlu.tokens[date.start_token:date.end_token])
+        date_object = parse_date(res, date_str, find_datetime_entity(req, date))
 
         if date_object is None:
             return
@@ -49,7 +60,7 @@ async def find_note(req: DialogRequest, res: DialogResponse) -> None:
 
         if len(notes) != 0:  # Successfully found a note
             ask_note_form(res)
-            res.send_user_data({'title': title.value, 'date': date.value})
+            res.send_user_data({'note_id': notes[0]['id']})
         else:  # Search failed
             res.send_message('Не нашлось заметки с таким названием за указанный день. Попробуйте ещё раз!')
     elif title is not None:
@@ -68,50 +79,63 @@ async def find_note_title_input(req: DialogRequest, res: DialogResponse) -> None
 
 @status_handler(DialogStatus.FIND_NOTE_DATE_INPUT)
 async def find_note_date_input(req: DialogRequest, res: DialogResponse) -> None:
-    date_str: str = req.command
-
     # Checking if date is correct
-    date: datetime.date = parse_date(res, date_str)
+    date: datetime.date = parse_date(res, req.command, find_datetime_entity(req))
 
     if date is None:
         return
 
-    # Additional check if any of the selected notes has this date
-    async with NoteStorage(req.user_id) as db:
-        note: List[Record] = await db.select_notes(req.user_data['title'], date)
+    # Additional check if any of the selected notes has this date. The notes have been listed on the previous turn,
+    # so there is no need to query them again
+    note_id: int | None = req.user_data['notes'].get(date.isoformat())
 
-    if len(note) == 0:
+    if note_id is None:
         res.send_message('Упс! По указанной дате ничего не нашлось. Попробуете ещё раз?')
         return
 
     ask_note_form(res)
-    res.send_user_data({'date': date_str, 'title': req.user_data['title']})
+    res.send_user_data({'note_id': note_id})
 
 
 @status_handler(DialogStatus.FIND_NOTE_FORM_INPUT)
 async def find_note_form_input(req: DialogRequest, res: DialogResponse) -> None:
-    title: str = req.user_data['title']
-    res.send_user_data({'title': title})
+    note_id: int = req.user_data['note_id']
+    res.send_user_data({'note_id': note_id})
 
     async with NoteStorage(req.user_id) as db:
-        if 'date' not in req.user_data:
-            note: List[Record] = await db.select_notes(title)
-        else:
-            date_str: str = req.user_data['date']
-
-            res.send_user_data({'date': date_str})
-
-            # At this point we've ensured that the date is fully correct and that the note does exist
-            date: datetime.date = parse_date(res, date_str)
+        note: Record | None = await db.select_note(note_id)
 
-            note: List[Record] = await db.select_notes(title, date)
+    # The note might have been deleted in the meantime, e.g. from another device
+    if note is None:
+        res.send_message('Похоже, этой заметки больше нет.')
+        return
 
     confirm = 'YANDEX.CONFIRM' in req.nlu.intents or 'confirm' in req.nlu.intents
     reject = 'YANDEX.REJECT' in req.nlu.intents or 'reject' in req.nlu.intents
     if confirm:
-        res.send_message(note[0][1])
+        short_note: str | None = note['short_note']
+
+        # The short form may not exist yet, either in lazy mode or if its summarization job hasn't been done so far.
+        # In eager mode a pending job would make a call of our own a duplicate. Notes without one (e.g. stored
+        # before, imported, or whose job has failed for good) are summarized on demand like in lazy mode
+        if short_note is None:
+            pending = False
+            if SHORT_NOTE_MODE == 'eager':
+                async with NoteStorage(req.user_id) as db:
+                    pending = await db.has_pending_summary_job(note_id)
+
+            if pending:
+                summary_queue.notify()
+            else:
+                short_note = await request_short_note(note['full_note'], req.user_id, note_id)
+
+        if short_note is not None:
+            res.send_message(short_note)
+        else:
+            res.send_message('Готовлю краткую версию заметки, это займёт немного времени. '
+                             'Спросите меня о ней чуть позже!')
     elif reject:
-        res.send_message(note[0][0])
+        res.send_message(note['full_note'])
     else:
         res.send_message('Извините, не понял вас! Повторите, в какой форме вы хотите услышать заметку:'
                          ' краткой или полной?')
@@ -1,4 +1,5 @@
-from typing import List
+import datetime
+from typing import List, Tuple
 
 from asyncpg import Record
 
@@ -6,42 +7,56 @@ from dialog_manager import DialogRequest, DialogResponse, DialogStatus, status_h
 from note_storage import NoteStorage
 from util import transform_date
 
+PAGE_SIZE = 3
+
 
 async def pretty_print_notes(res: DialogResponse, notes: List) -> None:
     for note in notes:
-        title, date = note[2], transform_date(note[3])
+        title, date = note['title'], transform_date(note['date'])
         res.send_message(f"«{title}» от {date}")
 
 
-@status_handler(DialogStatus.LIST_ALL_NOTES)
-async def list_all_notes(req: DialogRequest, res: DialogResponse) -> None:
-    if 'list_all_notes' in req.nlu.intents:
-        page = 0
-    else:
-        page = req.user_data.get('page')
+async def send_page(req: DialogRequest, res: DialogResponse) -> None:
+    """Send a page of notes. Shared by both handlers, as calling a decorated handler would wrap it in a deadline and
+    record its metrics twice."""
 
+    # The cursor is the (date, title) pair of the last note shown on the previous page
+    cursor: Tuple[datetime.date, str] | None = None
+    if 'list_all_notes' not in req.nlu.intents:
+        date_str, title = req.user_data['cursor']
+        cursor = (datetime.date.fromisoformat(date_str), title)
+
+    # One extra note is requested just to find out whether there is a next page
     async with NoteStorage(req.user_id) as db:
-        notes: List[Record] = (await db.select_notes())[::-1]
-        notes.sort(key=lambda x: x[3], reverse=True)
+        notes: List[Record] = await db.select_note_titles(PAGE_SIZE + 1, cursor)
+
+    has_next_page = len(notes) > PAGE_SIZE
+    notes = notes[:PAGE_SIZE]
 
-    if len(notes) == 0:
+    if cursor is None and len(notes) == 0:
         res.send_message('У вас не сохранено ни одной заметки. Добавьте новую по команде "новая запись".')
         return
-    elif len(notes) <= 3:
+    elif cursor is None and not has_next_page:
         res.send_message('У вас сохранены следующие заметки:\n')
-        await pretty_print_notes(res, notes)
-    else:
-        if page == 0:
-            res.send_message('Ваши недавние заметки:')
-        await pretty_print_notes(res, notes[page * 3: (page + 1) * 3])
-        if len(notes) > (page + 1) * 3:
-            res.send_message('Для получения более старых заметок скажите "далее".')
-            res.send_user_data({'page': page + 1})
+    elif cursor is None:
+        res.send_message('Ваши недавние заметки:')
+
+    await pretty_print_notes(res, notes)
+
+    if has_next_page:
+        last_note = notes[-1]
+        res.send_message('Для получения более старых заметок скажите "далее".')
+        res.send_user_data({'cursor': [last_note['date'].isoformat(), last_note['title']]})
+
+
+@status_handler(DialogStatus.LIST_ALL_NOTES)
+async def list_all_notes(req: DialogRequest, res: DialogResponse) -> None:
+    await send_page(req, res)
 
 
 @status_handler(DialogStatus.LIST_NEXT)
 async def list_next(req: DialogRequest, res: DialogResponse) -> None:
-    if req.user_data.get('page') is not None:
-        await list_all_notes(req, res)
+    if req.user_data.get('cursor') is not None:
+        await send_page(req, res)
     else:
         res.send_message('Извините, не понял Вас. Попробуйте переформулировать запрос или попросите меня помочь.')
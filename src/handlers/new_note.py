@@ -1,73 +1,132 @@
 import asyncio
 import datetime
-from typing import List
-
-from asyncpg import Record
+import uuid
 
 from dialog_manager import status_handler, DialogStatus, DialogRequest, DialogResponse, Intent
+from note_drafts import draft_buffer
 from note_storage import NoteStorage
-from summarize import create_short_note
+from summarize import SHORT_NOTE_MODE
+from summary_queue import summary_queue
+
+
+async def start_note_creation(req: DialogRequest, res: DialogResponse, title, text):
+    # If the note has already been dictated and was rejected only because of its title, save it under the new one
+    if req.user_data is not None and 'unsaved_draft' in req.user_data:
+        draft_id, chunks = req.user_data['unsaved_draft']
+        await save_note(req, res, title, draft_id, chunks)
+        return
+
+    # The dictated text itself is kept on the server, the session only knows the draft and how many chunks it has
+    res.send_message('Слушаю вас! Скажите конец, когда закончите!')
+    res.send_user_data({'title': title, 'draft_id': uuid.uuid4().hex, 'chunks': 0})
+    res.send_status(DialogStatus.NEW_NOTE_TEXT_INPUT)
+
 
+async def insert_note(user_id: str, title: str, draft_id: str) -> bool:
+    async with NoteStorage(user_id) as db:
+        return await db.insert_draft_note(title, draft_id, summarize=SHORT_NOTE_MODE == 'eager')
 
-async def start_note_creation(req: DialogRequest, res: DialogResponse, title, date, text):
-    async with NoteStorage(req.user_id) as db:
-        notes: List[Record] = await db.select_notes(title, date)
 
-    # We cannot create two notes with the same title and date. Thus, we send the user back to title input
-    if len(notes) > 0:
+async def is_saved(user_id: str, title: str, draft_id: str) -> bool:
+    """Whether the draft has already been turned into today's note with this title, e.g. by a previous request which
+    ran out of time before it could answer. Saving a note removes its draft, while a conflicting title keeps it."""
+
+    if await draft_buffer.count(user_id, draft_id) > 0:
+        return False
+
+    async with NoteStorage(user_id) as db:
+        return len(await db.select_notes(title, datetime.date.today())) != 0
+
+
+async def save_note(req: DialogRequest, res: DialogResponse, title: str, draft_id: str, chunks: int) -> None:
+    if chunks == 0:
+        res.send_message('Вы ещё ничего не продиктовали. Продолжаю вас слушать.')
+        res.send_user_data({'title': title, 'draft_id': draft_id, 'chunks': chunks})
+        res.send_status(DialogStatus.NEW_NOTE_TEXT_INPUT)
+        return
+
+    # Chunks are written to the database in the background, possibly by another worker
+    complete = True
+    if not await draft_buffer.wait_for(req.user_id, draft_id, chunks):
+        if await is_saved(req.user_id, title, draft_id):
+            res.send_message('Новая заметка успешно добавлена!')
+            return
+
+        # The first time, the chunks may just be late. The second time, some are most likely lost for good (e.g. a
+        # worker has died before flushing them), so whatever has reached the database is saved
+        if not (req.user_data or {}).get('save_retry', False):
+            res.send_message('Не успел сохранить заметку. Скажите конец ещё раз, пожалуйста.')
+            res.send_user_data({'title': title, 'draft_id': draft_id, 'chunks': chunks, 'save_retry': True})
+            res.send_status(DialogStatus.NEW_NOTE_TEXT_INPUT)
+            return
+
+        chunks = await draft_buffer.count(req.user_id, draft_id)
+        if chunks == 0:
+            res.send_message('К сожалению, текст заметки не сохранился. Попробуйте надиктовать её ещё раз.')
+            return
+        complete = False
+
+    # Inserting the note removes the draft, so the request's deadline must not cancel the insert once it has begun
+    inserted: bool = await asyncio.shield(insert_note(req.user_id, title, draft_id))
+
+    # We cannot create two notes with the same title and date. Thus, we send the user back to title input,
+    # keeping the dictated draft so that it is not lost
+    if not inserted:
         res.send_message('У вас уже есть заметка с таким названием, записанная сегодня. Придумайте что-нибудь другое.')
+        res.send_user_data({'unsaved_draft': [draft_id, chunks]})
+        res.send_status(DialogStatus.NEW_NOTE_TITLE_INPUT)
+        return
+
+    # Short form creation has been enqueued along with the note, because it usually holds the request for >1 second
+    # (bad for UX). Here we only let the workers know there is something to do. In lazy mode nothing is enqueued,
+    # the short form is created on its first request instead
+    if SHORT_NOTE_MODE == 'eager':
+        summary_queue.notify()
+
+    if complete:
+        res.send_message('Новая заметка успешно добавлена!')
     else:
-        res.send_message('Слушаю вас! Скажите конец, когда закончите!')
-        res.send_user_data({'title': title})
-        res.send_status(DialogStatus.NEW_NOTE_TEXT_INPUT)
+        res.send_message('Новая заметка добавлена, но часть текста, к сожалению, не сохранилась.')
 
 
 @status_handler(DialogStatus.NEW_NOTE)
 async def new_note(req: DialogRequest, res: DialogResponse) -> None:
     intent: Intent = req.nlu.intents.get('new_note')
-    date: datetime.date = datetime.date.today()
 
     if 'title' not in intent.slots:
         res.send_status(DialogStatus.NEW_NOTE_TITLE_INPUT)
         res.send_message('Назовите имя вашей записи.')
     else:
-        await start_note_creation(req, res, intent.slots['title'].value, date, 'Начинаю запись! '
-                                                                               'Скажите конец, когда закончите.')
+        await start_note_creation(req, res, intent.slots['title'].value, 'Начинаю запись! '
+                                                                         'Скажите конец, когда закончите.')
 
 
 @status_handler(DialogStatus.NEW_NOTE_TITLE_INPUT)
 async def new_note_title_input(req: DialogRequest, res: DialogResponse) -> None:
     title: str = req.command
-    date: datetime.date = datetime.date.today()
 
-    await start_note_creation(req, res, title, date, 'Слушаю вас! Скажите конец, когда закончите!')
+    await start_note_creation(req, res, title, 'Слушаю вас! Скажите конец, когда закончите!')
 
 
 @status_handler(DialogStatus.NEW_NOTE_TEXT_INPUT)
 async def new_note_text_input(req: DialogRequest, res: DialogResponse) -> None:
     title: str = req.user_data['title']
-    res.send_user_data({'title': title})
+    draft_id: str = req.user_data['draft_id']
+    chunks: int = req.user_data['chunks']
 
     text_part: str = req.user_input
-    previous_text: str = ''
-    if 'text' in req.user_data:
-        previous_text = req.user_data['text']
-
-    full_note = previous_text + '. ' + text_part
-
-    res.send_user_data({'text': full_note})
-
     if 'stop' in req.nlu.intents:
-        full_note = full_note.replace('конец', '').strip()
+        text_part = text_part.replace('конец', '').strip()
 
-        async with NoteStorage(req.user_id) as db:
-            await db.insert_new_note(title, full_note)
+    # The chunk number comes from the session, so a repeated request cannot append the same fragment twice
+    if text_part:
+        draft_buffer.append(req.user_id, draft_id, chunks, text_part)
+        chunks += 1
 
-        # Running short form creation in the background because it usually holds the request for >1 second (bad for UX)
-        today: datetime.date = datetime.date.today()
-        asyncio.create_task(create_short_note(full_note, req.user_id, title, today))
+    res.send_user_data({'title': title, 'draft_id': draft_id, 'chunks': chunks})
 
-        res.send_message('Новая заметка успешно добавлена!')
+    if 'stop' in req.nlu.intents:
+        await save_note(req, res, title, draft_id, chunks)
     else:
         res.send_message('Продолжаю вас слушать.')
         res.send_tts('<speaker audio="dialogs-upload/e68824e5-6f7b-4ffa-9ed7-f269652819fe/'
@@ -0,0 +1,126 @@
+"""IAM token management for Yandex Cloud calls."""
+
+import asyncio
+import datetime
+import logging
+import os
+import re
+from typing import Any, Dict, Final
+
+import deadline
+from api_client import ApiClient, api_client
+
+logger = logging.getLogger(__name__)
+
+_FRACTION = re.compile(r'\.(\d{6})\d*')
+
+
+def parse_expiry(value: str) -> datetime.datetime:
+    """Parse `expiresAt` of the IAM API, e.g. '2024-03-12T15:16:02.046346127Z', into an aware datetime."""
+
+    # fromisoformat() of older Pythons understands neither 'Z' nor nanoseconds
+    value = _FRACTION.sub(r'.\1', value.replace('Z', '+00:00'))
+    return datetime.datetime.fromisoformat(value)
+
+
+class IamTokenProvider:
+    """Keeps an IAM token in memory along with its expiry time and refreshes it ahead of expiry. Concurrent callers
+    that need a refresh wait for a single shared request instead of making their own."""
+
+    URL: Final[str] = 'https://iam.api.cloud.yandex.net/iam/v1/tokens'
+    TIMEOUT: Final[float] = float(os.getenv('IAM_TIMEOUT', 5.0))
+    REFRESH_MARGIN: Final[float] = float(os.getenv('IAM_REFRESH_MARGIN', 900.0))  # Seconds before expiry
+    RETRIES: Final[int] = int(os.getenv('IAM_RETRIES', 3))
+    BACKOFF_BASE: Final[float] = float(os.getenv('IAM_BACKOFF_BASE', 1.0))
+    DEFAULT_LIFETIME: Final[float] = 3600.0  # Assumed if the response doesn't tell when the token expires
+
+    def __init__(self, client: ApiClient, oauth_token: str | None) -> None:
+        self.__client: ApiClient = client
+        self.__oauth_token: str | None = oauth_token
+        self.__refresh_task: asyncio.Task | None = None
+
+        self.token: str | None = None
+        self.expires_at: datetime.datetime | None = None
+
+        self.refreshes: int = 0
+        self.failures: int = 0
+
+    @property
+    def needs_refresh(self) -> bool:
+        if self.token is None or self.expires_at is None:
+            return True
+
+        remaining = (self.expires_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+        return remaining < self.REFRESH_MARGIN
+
+    @property
+    def is_valid(self) -> bool:
+        return self.token is not None and self.expires_at > datetime.datetime.now(datetime.timezone.utc)
+
+    async def get(self) -> str | None:
+        """Return a valid token, refreshing it first if it is about to expire. Returns None only if there is no valid
+        token and it could not be obtained."""
+
+        if self.needs_refresh:
+            await self.refresh()
+
+        return self.token if self.is_valid else None
+
+    async def refresh(self) -> None:
+        if self.__refresh_task is None or self.__refresh_task.done():
+            # The refresh is shared, so it must not be bound by the deadline of the request which has started it
+            self.__refresh_task = deadline.detached_task(self.__refresh())
+
+        # Shielding keeps the shared refresh going when one of the waiters is cancelled
+        await asyncio.shield(self.__refresh_task)
+
+    async def refresh_if_needed(self) -> None:
+        """A scheduled job which keeps the token fresh, so that requests rarely have to wait for a refresh."""
+
+        if self.needs_refresh:
+            await self.refresh()
+
+    async def __refresh(self) -> None:
+        data = {
+            "yandexPassportOauthToken": self.__oauth_token
+        }
+
+        for attempt in range(self.RETRIES):
+            json: Dict | None = await self.__client.post_json('iam', self.URL, data, timeout=self.TIMEOUT)
+            if json is not None and 'iamToken' in json:
+                self.__store(json)
+                self.refreshes += 1
+                return
+
+            self.failures += 1
+
+            if attempt + 1 < self.RETRIES:
+                await asyncio.sleep(self.BACKOFF_BASE * 2 ** attempt)
+
+        # The previous token may still be valid for a while, so it is kept until it actually expires
+        logger.error('Failed to obtain new IAM token after %d attempts', self.RETRIES)
+
+    def __store(self, json: Dict) -> None:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        try:
+            expires_at = parse_expiry(json['expiresAt'])
+        except (KeyError, ValueError):
+            expires_at = now + datetime.timedelta(seconds=self.DEFAULT_LIFETIME)
+
+        self.token = json['iamToken']
+        self.expires_at = expires_at
+
+    def stats(self) -> Dict[str, Any]:
+        expires_in = 0.0
+        if self.expires_at is not None:
+            expires_in = max(0.0, (self.expires_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+        return {
+            'valid': self.is_valid,
+            'expires_in_seconds': expires_in,
+            'refreshes': self.refreshes,
+            'failures': self.failures
+        }
+
+
+iam_tokens: IamTokenProvider = IamTokenProvider(api_client, os.getenv('OAUTH_TOKEN'))
@@ -0,0 +1,56 @@
+"""JSON encoding/decoding for the webhook path: orjson when it is installed, the standard library otherwise."""
+
+import json
+from types import MappingProxyType
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # orjson is an optional speed-up
+    orjson = None
+
+BACKEND: str = 'orjson' if orjson is not None else 'json'
+
+
+def fragment(obj: Any) -> Any:
+    """Prepare a constant part of payloads once, so that it can be shared between them. With orjson it's encoded right
+    away and embedded into every `dumps` result as is (orjson>=3.9), otherwise it's turned into read-only mappings and
+    tuples."""
+
+    if orjson is not None and hasattr(orjson, 'Fragment'):
+        return orjson.Fragment(orjson.dumps(obj))
+
+    return _freeze(obj)
+
+
+def _freeze(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return MappingProxyType({key: _freeze(value) for key, value in obj.items()})
+    if isinstance(obj, (list, tuple)):
+        return tuple(_freeze(value) for value in obj)
+
+    return obj
+
+
+def _thaw(obj: Any) -> Any:
+    # Both encoders accept tuples, but need the read-only mappings of `fragment` to be converted
+    if isinstance(obj, MappingProxyType):
+        return dict(obj)
+
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def loads(data: bytes | str) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize `obj` to UTF-8 encoded JSON bytes, ready to be used as a response body."""
+
+    if orjson is not None:
+        return orjson.dumps(obj, default=_thaw)
+
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=_thaw).encode()
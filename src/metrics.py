@@ -0,0 +1,158 @@
+"""Minimal Prometheus-format metrics: labelled counters and histograms, plus snapshots of the components' own stats,
+served on a separate `/metrics` route."""
+
+import inspect
+import logging
+import math
+from typing import Any, Awaitable, Callable, Dict, Final, List, Tuple
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Alice drops responses after ~3 seconds, so the buckets are denser around that deadline
+DEFAULT_BUCKETS: Final[Tuple[float, ...]] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 1.5, 2.0,
+                                             2.5, 3.0, 5.0, 10.0)
+
+StatsSource = Callable[[], Dict[str, Any] | Awaitable[Dict[str, Any]]]
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ''
+
+    pairs = ','.join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> None:
+        self.name: str = name
+        self.documentation: str = documentation
+        self.labelnames: Tuple[str, ...] = labelnames
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+        REGISTRY.append(self)
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for labels, value in self.values.items():
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.name: str = name
+        self.documentation: str = documentation
+        self.labelnames: Tuple[str, ...] = labelnames
+        self.buckets: Tuple[float, ...] = buckets + (math.inf,)
+
+        # Per label set: non-cumulative bucket counts, sum and count
+        self.values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *labels: str) -> None:
+        if labels not in self.values:
+            self.values[labels] = ([0] * len(self.buckets), [0.0, 0.0])
+
+        counts, total = self.values[labels]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+
+        total[0] += value
+        total[1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for labels, (counts, (value_sum, count)) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == math.inf else repr(bound)
+                bucket_labels = _format_labels(self.labelnames + ('le',), labels + (le,))
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_str} {value_sum}')
+            lines.append(f'{self.name}_count{label_str} {int(count)}')
+        return lines
+
+
+REGISTRY: List[Counter | Histogram] = []
+
+# Components keep their own counters (see e.g. `Database.stats()`); these are exported as gauges on every scrape
+STATS_SOURCES: Dict[str, Tuple[StatsSource, str | None]] = {}
+
+
+def register_stats(prefix: str, source: StatsSource, label: str | None = None) -> None:
+    """Export numeric values of the dict returned by `source` as `<prefix>_<key>` gauges. If `label` is given, the
+    dict is expected to be nested one level deeper, and its top-level keys become the values of that label."""
+
+    STATS_SOURCES[prefix] = (source, label)
+
+
+def _render_stats(prefix: str, stats: Dict[str, Any], label: str | None) -> List[str]:
+    samples: Dict[str, List[str]] = {}
+    groups = stats.items() if label is not None else [(None, stats)]
+    for group, values in groups:
+        label_str = _format_labels((label,), (group,)) if label is not None else ''
+        for key, value in values.items():
+            if isinstance(value, (int, float)):  # bool is an int as well
+                samples.setdefault(f'{prefix}_{key}', []).append(f'{prefix}_{key}{label_str} {float(value)}')
+
+    lines = []
+    for name, name_samples in samples.items():
+        lines.append(f'# TYPE {name} gauge')
+        lines.extend(name_samples)
+    return lines
+
+
+async def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+
+    for prefix, (source, label) in STATS_SOURCES.items():
+        try:
+            stats = source()
+            if inspect.isawaitable(stats):
+                stats = await stats
+        except Exception:  # A broken source must not take the whole endpoint down
+            logger.exception('Failed to collect %s stats', prefix)
+            continue
+
+        lines.extend(_render_stats(prefix, stats, label))
+
+    return '\n'.join(lines) + '\n'
+
+
+async def metrics_handler(request: web.BaseRequest) -> web.Response:
+    """Handles '/metrics' request from Prometheus."""
+
+    return web.Response(body=(await render()).encode(),
+                        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+
+REQUEST_PARSE_SECONDS: Final[Histogram] = Histogram('dialog_request_parse_seconds',
+                                                    'Time spent decoding the webhook body and building DialogRequest',
+                                                    ('status',))
+HANDLER_SECONDS: Final[Histogram] = Histogram('dialog_handler_seconds',
+                                              'Time spent in the status handler, including response assembly',
+                                              ('status',))
+SERIALIZATION_SECONDS: Final[Histogram] = Histogram('dialog_serialization_seconds',
+                                                    'Time spent encoding the response body', ('status',))
+REQUEST_SECONDS: Final[Histogram] = Histogram('dialog_request_seconds', 'Total webhook processing time',
+                                              ('status',))
+HANDLER_ERRORS: Final[Counter] = Counter('dialog_handler_errors_total', 'Unhandled exceptions raised by handlers',
+                                         ('status',))
+DEADLINE_EXCEEDED: Final[Counter] = Counter('dialog_deadline_exceeded_total',
+                                            'Requests answered with a fallback because their deadline ran out',
+                                            ('status',))
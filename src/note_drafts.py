@@ -0,0 +1,146 @@
+"""Server-side storage of notes being dictated. Every dictated fragment is appended to the `note_drafts` table as a
+numbered chunk, so session state only carries the draft id and the number of chunks instead of the whole growing text.
+
+Chunks are written behind: a webhook only puts its chunk into an in-memory buffer, which is flushed in batches in the
+background. The next turn may be served by another worker, so the final turn waits until the database holds every
+chunk the session knows about before the note is assembled (see `NoteStorage.insert_draft_note`)."""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Final, List, Tuple
+
+import asyncpg
+from aiohttp import web
+
+import deadline
+from note_storage import Database
+
+logger = logging.getLogger(__name__)
+
+
+class DraftBuffer:
+    """Collects draft chunks in memory and writes them to the database every `FLUSH_INTERVAL` seconds, or as soon as
+    `MAX_PENDING` of them have piled up."""
+
+    FLUSH_INTERVAL: Final[float] = float(os.getenv('DRAFT_FLUSH_INTERVAL', 0.05))
+    MAX_PENDING: Final[int] = int(os.getenv('DRAFT_MAX_PENDING', 256))
+    WAIT_TIMEOUT: Final[float] = float(os.getenv('DRAFT_WAIT_TIMEOUT', 1.0))
+    WAIT_POLL_INTERVAL: Final[float] = 0.05
+    TTL_HOURS: Final[int] = int(os.getenv('DRAFT_TTL_HOURS', 24))  # Abandoned drafts are removed after that
+
+    def __init__(self) -> None:
+        self.__pending: List[Tuple[str, str, int, str]] = []  # (draft_id, user_id, seq, chunk)
+        self.__flusher: asyncio.Task | None = None
+        self.__wakeup: asyncio.Event | None = None
+        self.__stopping: bool = False
+
+        self.flushed: int = 0
+        self.flush_errors: int = 0
+        self.wait_timeouts: int = 0
+
+    def append(self, user_id: str, draft_id: str, seq: int, chunk: str) -> None:
+        """Add the `seq`-th chunk (counting from 0) to a draft. Appending the same chunk twice is harmless."""
+
+        self.__pending.append((draft_id, user_id, seq, chunk))
+        if len(self.__pending) >= self.MAX_PENDING and self.__wakeup is not None:
+            self.__wakeup.set()
+
+    async def flush(self) -> None:
+        if not self.__pending:
+            return
+
+        batch, self.__pending = self.__pending, []
+        try:
+            await Database.fetch('insert_draft_chunks', *map(list, zip(*batch)))
+        except Exception:
+            # Put the chunks back, so that the next flush retries them
+            self.__pending[:0] = batch
+            self.flush_errors += 1
+            raise
+
+        self.flushed += len(batch)
+
+    async def wait_for(self, user_id: str, draft_id: str, chunks: int, timeout: float = WAIT_TIMEOUT) -> bool:
+        """Wait until the database holds `chunks` chunks of a draft, which may still be in this or another worker's
+        buffer. Returns False if they didn't show up within `timeout` seconds (or by the request's deadline)."""
+
+        wait_until = time.monotonic() + deadline.limit(timeout)
+        if any(pending[0] == draft_id for pending in self.__pending):
+            await self.flush()
+
+        while True:
+            if await self.count(user_id, draft_id) >= chunks:
+                return True
+
+            if time.monotonic() + self.WAIT_POLL_INTERVAL > wait_until:
+                self.wait_timeouts += 1
+                return False
+            await asyncio.sleep(self.WAIT_POLL_INTERVAL)
+
+    async def count(self, user_id: str, draft_id: str) -> int:
+        """Number of chunks of a draft which are in the database."""
+
+        row: asyncpg.Record = (await Database.fetch('count_draft_chunks', draft_id, user_id))[0]
+        return row['chunks']
+
+    async def start(self) -> None:
+        self.__stopping = False
+        self.__wakeup = asyncio.Event()
+        self.__flusher = asyncio.create_task(self.__run())
+
+    async def stop(self) -> None:
+        """Stop the background flushes and write out whatever is still buffered."""
+
+        self.__stopping = True
+        if self.__flusher is not None:
+            self.__wakeup.set()
+            await self.__flusher
+            self.__flusher = None
+
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception('Failed to flush %d draft chunks on shutdown', len(self.__pending))
+
+    async def __run(self) -> None:
+        while not self.__stopping:
+            try:
+                await asyncio.wait_for(self.__wakeup.wait(), timeout=self.FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.__wakeup.clear()
+
+            try:
+                await self.flush()
+            except Exception:  # The chunks stay buffered and are retried on the next round
+                logger.exception('Failed to flush draft chunks')
+
+    async def prune(self) -> None:
+        """Remove drafts which have never been turned into notes, e.g. because the user left mid-dictation."""
+
+        await Database.fetch('prune_note_drafts', self.TTL_HOURS)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'pending': len(self.__pending),
+            'flushed': self.flushed,
+            'flush_errors': self.flush_errors,
+            'wait_timeouts': self.wait_timeouts
+        }
+
+
+draft_buffer: DraftBuffer = DraftBuffer()
+
+
+async def start_draft_buffer(app: web.Application) -> None:
+    """On application start, launch the background flushes of draft chunks."""
+
+    await draft_buffer.start()
+
+
+async def cleanup_draft_buffer(app: web.Application) -> None:
+    """Write out the buffered draft chunks before the database pool is closed."""
+
+    await draft_buffer.stop()
@@ -1,18 +1,338 @@
 """Module which contains database-related tools."""
 
+import asyncio
 import datetime
 import json
+import logging
 import os
+import random
+import time
+from collections import OrderedDict
 from types import TracebackType
-from typing import Dict, Final, List
+from typing import Any, Dict, Final, List, Set, Tuple
 
 import asyncpg
+from aiohttp import web
+
+import deadline
+from metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+DB_ACQUIRE_SECONDS: Final[Histogram] = Histogram('db_acquire_seconds', 'Time spent waiting for a pooled connection')
+DB_QUERY_SECONDS: Final[Histogram] = Histogram('db_query_seconds', 'Prepared query execution time', ('query',))
+DB_QUERY_ROWS: Final[Counter] = Counter('db_query_rows_total', 'Rows returned by prepared queries', ('query',))
+DB_QUERY_ERRORS: Final[Counter] = Counter('db_query_errors_total', 'Prepared queries that raised', ('query',))
+
+
+def load_queries(path: str) -> Dict[str, str]:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class Database:
+    """An application-wide connection pool shared by every database consumer."""
+
+    # Note that all sensitive info (including username, password etc.) is stored in env and loads automatically
+    MIN_SIZE: Final[int] = int(os.getenv('PG_POOL_MIN_SIZE', 2))
+    MAX_SIZE: Final[int] = int(os.getenv('PG_POOL_MAX_SIZE', 10))
+    ACQUIRE_TIMEOUT: Final[float] = float(os.getenv('PG_POOL_ACQUIRE_TIMEOUT', 2.0))
+    COMMAND_TIMEOUT: Final[float] = float(os.getenv('PG_COMMAND_TIMEOUT', 5.0))
+    MAX_INACTIVE_LIFETIME: Final[float] = float(os.getenv('PG_POOL_MAX_INACTIVE_LIFETIME', 300.0))
+    SLOW_QUERY_MS: Final[float] = float(os.getenv('SLOW_QUERY_MS', 200.0))
+    SLOW_QUERY_EXPLAIN_RATE: Final[float] = float(os.getenv('SLOW_QUERY_EXPLAIN_RATE', 0.0))
+
+    pool: asyncpg.Pool | None = None
+
+    # Saturation counters, see `stats()`
+    acquired_total: int = 0
+    acquire_wait_total: float = 0.0
+    acquire_timeouts: int = 0
+
+    __explain_tasks: Set[asyncio.Task] = set()
+
+    @classmethod
+    async def open(cls) -> None:
+        """Create the pool. Every connection prepares each known query on its first use and keeps it in asyncpg's
+        statement cache, which is big enough to hold all of them."""
+
+        if cls.pool is None:
+            cls.pool = await asyncpg.create_pool(min_size=cls.MIN_SIZE, max_size=cls.MAX_SIZE,
+                                                 command_timeout=cls.COMMAND_TIMEOUT,
+                                                 max_inactive_connection_lifetime=cls.MAX_INACTIVE_LIFETIME,
+                                                 statement_cache_size=max(100, len(NoteStorage.QUERIES)))
+
+    @classmethod
+    async def close(cls) -> None:
+        if cls.pool is not None:
+            await cls.pool.close()
+            cls.pool = None
+
+    @classmethod
+    async def acquire(cls) -> asyncpg.Connection:
+        """Take a connection from the pool. It must be given back with `release()`."""
+
+        start = time.perf_counter()
+        try:
+            conn = await cls.pool.acquire(timeout=deadline.limit(cls.ACQUIRE_TIMEOUT))
+        except asyncio.TimeoutError:
+            cls.acquire_timeouts += 1
+            raise
+
+        wait = time.perf_counter() - start
+        cls.acquired_total += 1
+        cls.acquire_wait_total += wait
+        DB_ACQUIRE_SECONDS.observe(wait)
+        return conn
+
+    @classmethod
+    async def release(cls, conn: asyncpg.Connection) -> None:
+        await cls.pool.release(conn)
+
+    @classmethod
+    async def run(cls, conn: asyncpg.Connection, query_id: str, *args, timeout: float | None = None) \
+            -> List[asyncpg.Record]:
+        """Execute a prepared query on the given connection, recording its timing and row count. Queries slower than
+        `SLOW_QUERY_MS` are logged, and a share of them (`SLOW_QUERY_EXPLAIN_RATE`) gets its plan logged as well.
+        `timeout` overrides `COMMAND_TIMEOUT` for this query. Within a request, the query never outlives its
+        deadline."""
+
+        timeout = deadline.limit(timeout)
+        start = time.perf_counter()
+        try:
+            # Statements prepared with `conn.prepare()` can't outlive a release of the connection back to the pool,
+            # while the statement cache behind `fetch()` is kept for the connection's whole lifetime
+            rows: List[asyncpg.Record] = await conn.fetch(NoteStorage.QUERIES[query_id], *args, timeout=timeout)
+        except Exception:
+            DB_QUERY_ERRORS.inc(query_id)
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            DB_QUERY_SECONDS.observe(duration, query_id)
+
+        DB_QUERY_ROWS.inc(query_id, amount=len(rows))
+
+        if duration * 1000 >= cls.SLOW_QUERY_MS:
+            logger.warning('Slow query %s: %.1f ms, %d rows', query_id, duration * 1000, len(rows))
+            if random.random() < cls.SLOW_QUERY_EXPLAIN_RATE:
+                # Explaining on a separate connection, so that the caller doesn't wait for it
+                task = deadline.detached_task(cls.__explain(query_id, args))
+                cls.__explain_tasks.add(task)
+                task.add_done_callback(cls.__explain_tasks.discard)
+
+        return rows
+
+    @classmethod
+    async def __explain(cls, query_id: str, args: tuple) -> None:
+        try:
+            conn = await cls.acquire()
+            try:
+                plan = await conn.fetch('EXPLAIN ' + NoteStorage.QUERIES[query_id], *args)
+            finally:
+                await cls.release(conn)
+        except Exception:  # Diagnostics are best effort
+            logger.exception('Failed to explain slow query %s', query_id)
+            return
+
+        logger.warning('Plan of slow query %s:\n%s', query_id, '\n'.join(row[0] for row in plan))
+
+    @classmethod
+    async def fetch(cls, query_id: str, *args) -> List[asyncpg.Record]:
+        """Run a single prepared query which is not bound to any particular user (e.g. service tables)."""
+
+        conn = await cls.acquire()
+        try:
+            return await cls.run(conn, query_id, *args)
+        finally:
+            await cls.release(conn)
+
+    @classmethod
+    async def validate(cls) -> None:
+        """Make sure every connection the pool keeps open is alive, every query can be prepared against the current
+        schema, and prepared queries can still be run after the connection has been released once."""
+
+        conns = await asyncio.gather(*(cls.acquire() for _ in range(cls.MIN_SIZE)))
+        try:
+            for conn in conns:
+                for query in NoteStorage.QUERIES.values():
+                    await conn.prepare(query)
+        finally:
+            for conn in conns:
+                await cls.release(conn)
+
+        conns = await asyncio.gather(*(cls.acquire() for _ in range(cls.MIN_SIZE)))
+        try:
+            for conn in conns:
+                await cls.run(conn, 'summary_jobs_stats')
+        finally:
+            for conn in conns:
+                await cls.release(conn)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        """Pool saturation snapshot: how many connections exist, how many are busy and how long we wait for them."""
+
+        if cls.pool is None:
+            return {}
+
+        size = cls.pool.get_size()
+        idle = cls.pool.get_idle_size()
+        return {
+            'size': size,
+            'idle': idle,
+            'in_use': size - idle,
+            'min_size': cls.pool.get_min_size(),
+            'max_size': cls.pool.get_max_size(),
+            'acquired_total': cls.acquired_total,
+            'acquire_wait_avg': cls.acquire_wait_total / cls.acquired_total if cls.acquired_total else 0.0,
+            'acquire_timeouts': cls.acquire_timeouts
+        }
+
+
+async def start_db_pool(app: web.Application) -> None:
+    """On application start, open the connection pool."""
+
+    await Database.open()
+
+
+async def cleanup_db_pool(app: web.Application) -> None:
+    """Close every pooled connection."""
+
+    await Database.close()
+
+
+class NoteCache:
+    """Per-user read-through cache of note selections, so that a multi-turn dialog doesn't query the same rows on every
+    turn. Entries expire after `TTL` seconds and all of a user's entries are dropped whenever their notes change.
+
+    A trigger on `user_notes` notifies every process of changed users (see `docker/seed.sql`), so writes made by other
+    workers, instances or admin tools are seen as well. Nothing is cached while the listening connection is down.
+    Setting NOTE_CACHE_TTL to 0 disables the cache."""
+
+    TTL: Final[float] = float(os.getenv('NOTE_CACHE_TTL', 30.0))
+    MAX_USERS: Final[int] = int(os.getenv('NOTE_CACHE_USERS', 4096))
+    MAX_ENTRIES_PER_USER: Final[int] = 16
+    CHANNEL: Final[str] = 'note_changes'
+    RECONNECT_DELAY: Final[float] = 5.0
+
+    def __init__(self) -> None:
+        # user_id -> (query_id, *args) -> (expiry, rows); users are kept in LRU order
+        self.__users: OrderedDict[str, Dict[Tuple, Tuple[float, List[asyncpg.Record]]]] = OrderedDict()
+        self.__listener: asyncpg.Connection | None = None
+        self.__reconnect_task: asyncio.Task | None = None
+        self.__stopping: bool = False
+
+        # Bumped on every invalidation, so that rows selected before a change are not cached after it
+        self.version: int = 0
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.invalidations: int = 0
+        self.disconnects: int = 0
+
+    async def start(self) -> None:
+        self.__stopping = False
+        if self.TTL > 0:
+            await self.__listen()
+
+    async def stop(self) -> None:
+        self.__stopping = True
+        if self.__reconnect_task is not None:
+            self.__reconnect_task.cancel()
+            self.__reconnect_task = None
+
+        if self.__listener is not None:
+            listener, self.__listener = self.__listener, None
+            await listener.close()
+
+    async def __listen(self) -> None:
+        try:
+            listener = await asyncpg.connect()
+            await listener.add_listener(self.CHANNEL, self.__notified)
+        except (asyncpg.PostgresError, OSError, asyncio.TimeoutError):
+            logger.exception('Failed to listen for note changes, the note cache is off until reconnected')
+            self.__reconnect_later()
+            return
+
+        listener.add_termination_listener(self.__disconnected)
+        self.__listener = listener
+
+    def __reconnect_later(self) -> None:
+        async def reconnect() -> None:
+            await asyncio.sleep(self.RECONNECT_DELAY)
+            self.__reconnect_task = None
+            await self.__listen()
+
+        if not self.__stopping and self.__reconnect_task is None:
+            self.__reconnect_task = asyncio.create_task(reconnect())
+
+    def __notified(self, conn: asyncpg.Connection, pid: int, channel: str, user_id: str) -> None:
+        self.invalidate(user_id)
+
+    def __disconnected(self, conn: asyncpg.Connection) -> None:
+        if self.__listener is not conn:
+            return
+
+        # Changes made while nobody listens would go unnoticed, so everything cached so far is dropped
+        self.__listener = None
+        self.__users.clear()
+        self.version += 1
+        self.disconnects += 1
+        self.__reconnect_later()
+
+    def get(self, user_id: str, key: Tuple) -> List[asyncpg.Record] | None:
+        entries = self.__users.get(user_id)
+        entry = entries.get(key) if entries is not None else None
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+
+        self.__users.move_to_end(user_id)
+        self.hits += 1
+        return list(entry[1])
+
+    def put(self, user_id: str, key: Tuple, rows: List[asyncpg.Record], version: int) -> None:
+        """Cache rows which were selected while the cache was at `version`."""
+
+        if self.TTL <= 0 or self.__listener is None or version != self.version:
+            return
+
+        entries = self.__users.setdefault(user_id, {})
+        self.__users.move_to_end(user_id)
+        entries.pop(key, None)
+        entries[key] = (time.monotonic() + self.TTL, list(rows))
+
+        if len(entries) > self.MAX_ENTRIES_PER_USER:
+            del entries[next(iter(entries))]
+        if len(self.__users) > self.MAX_USERS:
+            self.__users.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        self.version += 1
+        if self.__users.pop(user_id, None) is not None:
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'invalidations': self.invalidations,
+            'disconnects': self.disconnects,
+            'listening': self.__listener is not None,
+            'users': len(self.__users)
+        }
 
 
 class NoteStorage:
     """An asynchronous interface for convenient operations with notes created inside the skill."""
 
-    QUERIES: Final[Dict[str, str]] = json.load(open(os.getenv('SQL_QUERIES_PATH')))
+    QUERIES: Final[Dict[str, str]] = load_queries(os.getenv('SQL_QUERIES_PATH'))
+    SEARCH_LIMIT: Final[int] = int(os.getenv('NOTE_SEARCH_LIMIT', 5))
+    SEARCH_TIMEOUT: Final[float] = float(os.getenv('NOTE_SEARCH_TIMEOUT', 0.3))  # A hint must not delay the answer
+
+    cache: NoteCache = NoteCache()
 
     def __init__(self, user_id: str) -> None:
         self.__conn: asyncpg.Connection | None = None
@@ -20,24 +340,22 @@ class NoteStorage:
 
     # These dunder methods are implemented for a custom context manager
     async def __aenter__(self) -> 'NoteStorage':
-        # Note that all sensitive info (including username, password etc.) is stored in env and loads automatically
-        self.__conn = await asyncpg.connect()
+        self.__conn = await Database.acquire()
         return self
 
     async def __aexit__(self, exc_type: type[BaseException] | None,
                         exc_val: BaseException | None,
                         exc_tb: TracebackType | None) -> None:
         if self.__conn:
-            await self.__conn.close()
+            await Database.release(self.__conn)
+            self.__conn = None
 
-    async def __process_query(self, query_id: str, args: tuple | str | datetime.date | None = None) \
-            -> List[asyncpg.Record] | None:
-        """An inner method which properly executes a query by automatically retrieving its text/passing user_id
-        variable"""
+    async def __process_query(self, query_id: str, args: tuple | str | datetime.date | None = None,
+                              timeout: float | None = None) -> List[asyncpg.Record] | None:
+        """An inner method which properly executes a query by automatically retrieving its prepared statement/passing
+        user_id variable"""
 
         # To make sure only current user's notes are affected, each query must have user_id as its first variable
-        query = self.QUERIES[query_id]
-
         full_args = [self.user_id]
 
         # Depending on args value, we need to pack these arguments into full_args differently
@@ -45,44 +363,141 @@ class NoteStorage:
             full_args.append(args)
         elif isinstance(args, tuple):
             full_args.extend(args)
+        elif args is not None:
+            full_args.append(args)
+
+        return await Database.run(self.__conn, query_id, *full_args, timeout=timeout)
+
+    async def __cached_query(self, query_id: str, args: tuple | str | datetime.date | None = None) \
+            -> List[asyncpg.Record]:
+        """Same as `__process_query`, but for selections, which are served from the cache when possible."""
+
+        key = (query_id, args)
+        rows = self.cache.get(self.user_id, key)
+        if rows is None:
+            version = self.cache.version
+            rows = await self.__process_query(query_id, args)
+            self.cache.put(self.user_id, key, rows, version)
 
-        return await self.__conn.fetch(query, *full_args)
+        return rows
 
     async def select_notes(self, title: str | None = None, date: datetime.date | None = None) -> List[asyncpg.Record]:
         """Select notes related to a specific user. Returns a list of `Record` with a following form:
-        [full_note, short_note, title, date]"""
+        [full_note, short_note, title, date, id]"""
 
         if title is None and date is None:
-            return await self.__process_query('select_all_notes')
+            return await self.__cached_query('select_all_notes')
         elif title is None:
-            return await self.__process_query('select_notes_by_date', date)
+            return await self.__cached_query('select_notes_by_date', date)
         elif date is None:
-            return await self.__process_query('select_notes_by_title', title)
+            return await self.__cached_query('select_notes_by_title', title)
 
         # If both title and date are provided, only a single note should be retrieved as we cannot have two notes
         # with same titles and dates
-        return await self.__process_query('select_single_note', (title, date))
+        return await self.__cached_query('select_single_note', (title, date))
 
-    async def delete_notes(self, title: str | None = None, date: datetime.date | None = None) -> None:
+    async def select_note(self, note_id: int) -> asyncpg.Record | None:
+        """Select a single note by its id, as a `Record` of the same form as in `select_notes`. Returns None if the
+        note doesn't exist (anymore)."""
+
+        notes = await self.__cached_query('select_note_by_id', (note_id,))
+        return notes[0] if notes else None
+
+    async def has_pending_summary_job(self, note_id: int) -> bool:
+        """Whether the note's short form is going to be created by a summarization job (see `summary_queue`)."""
+
+        rows = await self.__process_query('has_pending_summary_job', (note_id,))
+        return rows[0]['pending']
+
+    async def search_notes(self, query: str, limit: int = SEARCH_LIMIT, timeout: float = SEARCH_TIMEOUT) \
+            -> List[asyncpg.Record]:
+        """Find notes whose title looks like `query` (trigram similarity) or whose title and text contain its words
+        (Russian full-text search), best matches first. Returns a list of `Record` with a following form:
+        [id, title, date, rank]. The search is only a hint for the user, so if it doesn't finish within `timeout`
+        seconds, an empty list is returned."""
+
+        try:
+            return await self.__process_query('search_notes', (query, limit), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning('Note search took longer than %.2f s', timeout)
+            return []
+
+    async def select_note_titles(self, limit: int, after: Tuple[datetime.date, str] | None = None) \
+            -> List[asyncpg.Record]:
+        """Select one page of note headers, newest first. Returns a list of `Record` with a following form:
+        [title, date]. Pass (date, title) of the last note seen as `after` to get the next page."""
+
+        if after is None:
+            return await self.__cached_query('select_note_titles_first_page', (limit,))
+
+        return await self.__cached_query('select_note_titles_page', (*after, limit))
+
+    async def delete_notes(self, title: str | None = None, date: datetime.date | None = None,
+                           guarded: bool = False) -> List[asyncpg.Record] | None:
         """Delete notes related to a specific user. Bear in mind that this is an irreversible action.
-        A developer probably should receive user confirmation before going on to delete any information."""
+        A developer probably should receive user confirmation before going on to delete any information.
 
-        if title is None and date is None:
-            await self.__process_query('delete_all_notes')
-        elif title is None:
-            await self.__process_query('delete_notes_by_date', date)
-        elif date is None:
-            await self.__process_query('delete_notes_by_title', title)
-        else:
-            await self.__process_query('delete_single_note', (title, date))
+        In `guarded` mode (title and/or date required) the deletion only happens if exactly one note matches, and
+        all the matching notes are returned as a list of `Record` with a following form: [id, title, date].
+        So a single returned note means it has been deleted, several ones mean that nothing has been touched."""
 
-    async def insert_new_note(self, title: str, text: str) -> None:
-        """Add newly created note to the database."""
+        if guarded and title is None and date is None:
+            raise ValueError('Guarded deletion requires a title or a date.')
+
+        try:
+            if guarded:
+                if title is None:
+                    return await self.__process_query('guarded_delete_by_date', date)
+                elif date is None:
+                    return await self.__process_query('guarded_delete_by_title', title)
+                return await self.__process_query('guarded_delete_single_note', (title, date))
+
+            if title is None and date is None:
+                await self.__process_query('delete_all_notes')
+            elif title is None:
+                await self.__process_query('delete_notes_by_date', date)
+            elif date is None:
+                await self.__process_query('delete_notes_by_title', title)
+            else:
+                await self.__process_query('delete_single_note', (title, date))
+        finally:
+            # Even if a guarded deletion touches nothing, the rows it has seen are newer than the cached ones
+            self.cache.invalidate(self.user_id)
+
+    async def delete_note(self, note_id: int) -> bool:
+        """Delete a single note by its id. Returns False if there was no such note."""
+
+        try:
+            deleted = await self.__process_query('delete_note_by_id', (note_id,))
+        finally:
+            self.cache.invalidate(self.user_id)
+        return len(deleted) != 0
+
+    async def insert_draft_note(self, title: str, draft_id: str, summarize: bool = True) -> bool:
+        """Assemble a dictated draft (see `note_drafts`) into a new note and remove the draft, in a single statement.
+        Unless `summarize` is False, the note's summarization is enqueued in the same statement. If a note with the
+        same title has already been created today, nothing is inserted, the draft is kept and False is returned."""
 
         date = datetime.date.today()
-        await self.__process_query("insert_new_note", (title, date, text))
+        inserted = await self.__process_query('insert_draft_note', (title, date, draft_id, summarize))
+        if inserted:
+            self.cache.invalidate(self.user_id)
+        return len(inserted) != 0
 
-    async def add_short_note_form(self, title: str, date: datetime.date, text: str) -> None:
+    async def add_short_note_form(self, note_id: int, text: str) -> None:
         """Update existing note entry with its short form."""
 
-        await self.__process_query('add_short_form', (title, date, text))
+        await self.__process_query('add_short_form', (note_id, text))
+        self.cache.invalidate(self.user_id)
+
+
+async def start_note_cache(app: web.Application) -> None:
+    """On application start, begin listening for note changes made by other processes."""
+
+    await NoteStorage.cache.start()
+
+
+async def cleanup_note_cache(app: web.Application) -> None:
+    """Close the listening connection."""
+
+    await NoteStorage.cache.stop()
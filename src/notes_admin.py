@@ -0,0 +1,191 @@
+"""Admin CLI for bulk transfer of notes through COPY, e.g. for backups and account merges:
+
+    python src/notes_admin.py export --format csv --user <user_id> --output notes.csv
+    python src/notes_admin.py import --format ndjson --input notes.ndjson --summarize
+
+COPY writes NULL as an unquoted empty CSV field and an empty string as a quoted one, which only the `csv` module of
+Python 3.12+ can tell apart. With older versions both are imported as NULL, so backups should rather use ndjson.
+"""
+
+import argparse
+import asyncio
+import csv
+import datetime
+import io
+import itertools
+import sys
+from typing import Any, BinaryIO, Dict, Final, Iterator, List, Tuple
+
+import asyncpg
+
+import json_codec
+from reporting import Progress
+
+COLUMNS: Final[Tuple[str, ...]] = ('user_id', 'title', 'date', 'full_note', 'short_note')
+BATCH_SIZE: Final[int] = 50_000
+
+# Reads unquoted empty fields as None (Python 3.12+)
+CSV_QUOTE_NOTNULL: Final[int | None] = getattr(csv, 'QUOTE_NOTNULL', None)
+
+Note = Tuple[str, str, datetime.date, str | None, str | None]
+
+EXPORT_QUERY: Final[str] = 'SELECT user_id, title, date, full_note, short_note FROM user_notes'
+USER_FILTER: Final[str] = ' WHERE user_id = ANY($1::varchar[])'
+
+# COPY has no JSON output format, so every JSON document is exported as a single CSV column, with quote and delimiter
+# characters which never appear in JSON text. This way COPY writes the documents out exactly as they are
+NDJSON_EXPORT_QUERY: Final[str] = ("SELECT json_build_object('user_id', user_id, 'title', title, 'date', date, "
+                                   "'full_note', full_note, 'short_note', short_note)::text FROM user_notes")
+NDJSON_QUOTE: Final[str] = '\x01'
+NDJSON_DELIMITER: Final[str] = '\x02'
+
+STAGING_TABLE: Final[str] = 'notes_import'
+CREATE_STAGING_TABLE: Final[str] = (f'CREATE TEMPORARY TABLE {STAGING_TABLE} (user_id varchar, title varchar, '
+                                    'date date, full_note varchar, short_note varchar) ON COMMIT DELETE ROWS')
+MERGE_STAGING_TABLE: Final[str] = ('WITH note AS (INSERT INTO user_notes (user_id, title, date, full_note, short_note) '
+                                   f'SELECT user_id, title, date, full_note, short_note FROM {STAGING_TABLE} '
+                                   'ON CONFLICT (user_id, title, date) DO NOTHING RETURNING id, user_id, short_note), '
+                                   'job AS (INSERT INTO summary_jobs (user_id, note_id) '
+                                   'SELECT user_id, id FROM note WHERE short_note IS NULL AND $1) '
+                                   'SELECT count(*) FROM note')
+
+
+def copy_status_rows(status: str) -> int:
+    """Number of rows from a command status like 'COPY 42'."""
+
+    return int(status.rsplit(' ', 1)[-1])
+
+
+async def export_notes(conn: asyncpg.Connection, output: BinaryIO, fmt: str, users: List[str] | None) -> None:
+    progress = Progress('exported')
+    args = (users,) if users else ()
+
+    async def write(chunk: bytes) -> None:
+        output.write(chunk)
+        progress.bytes += len(chunk)
+
+    if fmt == 'ndjson':
+        query = NDJSON_EXPORT_QUERY + (USER_FILTER if users else '')
+        status = await conn.copy_from_query(query, *args, output=write, format='csv',
+                                            quote=NDJSON_QUOTE, delimiter=NDJSON_DELIMITER)
+    else:
+        query = EXPORT_QUERY + (USER_FILTER if users else '')
+        status = await conn.copy_from_query(query, *args, output=write, format='csv', header=True)
+
+    output.flush()
+    progress.rows = copy_status_rows(status)
+    progress.report()
+
+
+def read_ndjson(stream: BinaryIO) -> Iterator[Dict[str, Any]]:
+    for line in stream:
+        if line.strip():
+            yield json_codec.loads(line)
+
+
+def read_csv(stream: BinaryIO) -> Iterator[Dict[str, Any]]:
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if CSV_QUOTE_NOTNULL is not None:
+        yield from csv.DictReader(text, quoting=CSV_QUOTE_NOTNULL)
+        return
+
+    # Empty strings and NULLs can't be told apart here, while missing short forms must stay NULL
+    for row in csv.DictReader(text):
+        yield {key: value or None for key, value in row.items()}
+
+
+def to_records(notes: Iterator[Dict[str, Any]], progress: Progress, user: str | None) -> Iterator[Note]:
+    for note in notes:
+        progress.rows += 1
+        yield (user or note['user_id'], note['title'], datetime.date.fromisoformat(note['date']),
+               note['full_note'], note.get('short_note'))
+
+
+class CountingReader(io.RawIOBase):
+    """Counts the bytes read from the underlying stream, for the throughput report."""
+
+    def __init__(self, stream: BinaryIO, progress: Progress) -> None:
+        super().__init__()
+        self.__stream: BinaryIO = stream
+        self.__progress: Progress = progress
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: memoryview) -> int:
+        data = self.__stream.read(len(buffer))
+        buffer[:len(data)] = data
+        self.__progress.bytes += len(data)
+        return len(data)
+
+
+async def import_notes(conn: asyncpg.Connection, stream: BinaryIO, fmt: str, user: str | None,
+                       batch_size: int, summarize: bool) -> None:
+    """COPY the notes into a staging table batch by batch, and merge each batch into `user_notes` in its own
+    transaction. Only `batch_size` rows are in flight at a time, on both sides. Notes which already exist (same user,
+    title and date) are skipped, so an interrupted import can simply be run again."""
+
+    progress = Progress('imported')
+    stream = io.BufferedReader(CountingReader(stream, progress))
+    notes = read_ndjson(stream) if fmt == 'ndjson' else read_csv(stream)
+    records = to_records(notes, progress, user)
+
+    await conn.execute(CREATE_STAGING_TABLE)
+
+    inserted = 0
+    while True:
+        async with conn.transaction():
+            status = await conn.copy_records_to_table(STAGING_TABLE, records=itertools.islice(records, batch_size),
+                                                      columns=COLUMNS)
+            if copy_status_rows(status) == 0:
+                break
+            inserted += await conn.fetchval(MERGE_STAGING_TABLE, summarize)
+
+        progress.counts['inserted'] = inserted
+        progress.report(end='')
+
+    progress.counts['skipped'] = progress.rows - inserted
+    progress.report()
+
+
+async def run(args: argparse.Namespace) -> None:
+    # Transfers take far longer than any sensible command timeout of the skill itself
+    conn: asyncpg.Connection = await asyncpg.connect(command_timeout=None)
+    try:
+        if args.command == 'export':
+            output = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+            try:
+                await export_notes(conn, output, args.format, args.user)
+            finally:
+                if output is not sys.stdout.buffer:
+                    output.close()
+        else:
+            stream = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+            try:
+                await import_notes(conn, stream, args.format, args.user, args.batch_size, args.summarize)
+            finally:
+                if stream is not sys.stdin.buffer:
+                    stream.close()
+    finally:
+        await conn.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = commands.add_parser('export', help='stream notes to a file or stdout')
+    export_parser.add_argument('--format', choices=('ndjson', 'csv'), default='ndjson',
+                               help='ndjson keeps empty strings apart from NULLs on every Python version')
+    export_parser.add_argument('--user', action='append', help='export only this user\'s notes (repeatable)')
+    export_parser.add_argument('--output', default='-', help='file to write, stdout by default')
+
+    import_parser = commands.add_parser('import', help='load notes from a file or stdin')
+    import_parser.add_argument('--format', choices=('ndjson', 'csv'), default='ndjson')
+    import_parser.add_argument('--user', help='import every note as this user\'s, e.g. to merge accounts')
+    import_parser.add_argument('--input', default='-', help='file to read, stdin by default')
+    import_parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='rows merged per transaction')
+    import_parser.add_argument('--summarize', action='store_true',
+                               help='enqueue summarization of imported notes which have no short form')
+
+    asyncio.run(run(parser.parse_args()))
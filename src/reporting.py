@@ -0,0 +1,33 @@
+"""Reporting helpers shared by the admin commands and the benchmarks."""
+
+import sys
+import time
+from typing import Dict, List
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Progress:
+    """Row and byte counters of a long-running command, reported to stderr along with the throughput."""
+
+    def __init__(self, action: str) -> None:
+        self.action: str = action
+        self.rows: int = 0
+        self.bytes: int = 0
+        self.counts: Dict[str, float] = {}  # Reported after the rows, e.g. {'inserted': 42}
+        self.start: float = time.monotonic()
+
+    def report(self, end: str = '\n') -> None:
+        """Print the counters over the previous report, which lets a loop keep a single status line up to date."""
+
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        details = ''.join(f', {key} {value:g}' for key, value in self.counts.items())
+        throughput = f'{self.rows / elapsed:.1f} rows/s'
+        if self.bytes:
+            throughput += f', {self.bytes / elapsed / 2 ** 20:.1f} MiB/s'
+
+        print(f'\r{self.action} {self.rows} rows{details} in {elapsed:.1f}s: {throughput}', end=end, file=sys.stderr,
+              flush=True)
@@ -1,34 +1,74 @@
 """Everything related to creation of short note forms,
-including side-tasks like scheduler setup for regular IAM-token updates."""
+including side-tasks like scheduler setup for keeping the IAM token fresh."""
 
+import asyncio
 import datetime
+import logging
 import os
-from typing import Dict
+from typing import Dict, Final, Tuple
 
 import aiohttp
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
+import deadline
+from api_client import api_client
+from iam_token import IamTokenProvider, iam_tokens
+from note_drafts import draft_buffer
 from note_storage import NoteStorage
+from summary_cache import summary_cache
 
+logger = logging.getLogger(__name__)
 
-async def make_post_request(url: str, data: Dict, headers: Dict | None = None) -> Dict | None:
-    """Make a simple asynchronous POST-request and return JSON in case of success."""
+_short_note_flights: Dict[Tuple[str, int], asyncio.Task] = {}
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url=url, json=data, headers=headers) as res:
-            if res.status == 200:
-                return await res.json()
+COMPLETION_ENDPOINT: Final[str] = 'completion'  # The name of its circuit breaker and counters
+COMPLETION_TIMEOUT: Final[float] = float(os.getenv('COMPLETION_TIMEOUT', 20.0))
+IAM_CHECK_INTERVAL: Final[float] = float(os.getenv('IAM_CHECK_INTERVAL', 60.0))  # Seconds between expiry checks
 
+# 'eager' summarizes every note right after creation, 'lazy' only when the short form is asked for the first time
+SHORT_NOTE_MODE: Final[str] = os.getenv('SHORT_NOTE_MODE', 'eager')
+SHORT_NOTE_WAIT: Final[float] = float(os.getenv('SHORT_NOTE_WAIT', 2.0))  # How long a webhook may wait for it
 
-async def create_short_note(text: str, user_id: str, title: str, date: datetime.date) -> None:
-    """A delayed background task which makes a request to YandexGPT and receives shortened text form as a response,
-    adding it to the database."""
+MODEL: Final[str] = 'yandexgpt-lite'
+PROMPT: Final[str] = ('Сократи и лаконично перефразируй текст. Объём текста должен быть сокращён минимум вдвое. '
+                      'Ты должен передать основную суть, события и, самое главное, эмоции.')
+PROMPT_VERSION: Final[int] = 1  # Must be bumped on every PROMPT change, so that old cached summaries are not reused
+
+
+def summary_key(text: str) -> str:
+    return summary_cache.key(text, MODEL, PROMPT_VERSION)
+
+
+async def summarize_text(text: str, tokens: IamTokenProvider = iam_tokens) -> str | None:
+    """Receive shortened text form from YandexGPT, unless the same text has already been summarized before.
+    Returns None if the short form could not be created."""
+
+    key = summary_key(text)
+    cached: str | None = await summary_cache.get(key)
+    if cached is not None:
+        return cached
+
+    result: str | None = await request_completion(text, tokens)
+    if result is not None:
+        await summary_cache.put(key, result)
+    return result
+
+
+async def request_completion(text: str, tokens: IamTokenProvider = iam_tokens, raise_rate_limited: bool = False) \
+        -> str | None:
+    """Make a request to YandexGPT, bypassing the summary cache. Returns None if the short form could not be created,
+    or raises `RateLimited` if YandexGPT has throttled the call and `raise_rate_limited` is set."""
+
+    token: str | None = await tokens.get()
+    if token is None:
+        logger.error('No valid IAM token to call YandexGPT with')
+        return None
 
     url = 'https://llm.api.cloud.yandex.net/foundationModels/v1/completion'
     headers = {"Content-Type": "application/json; charset=utf-8",
-               "Authorization": f"Bearer {os.getenv('IAM_TOKEN')}"}
+               "Authorization": f"Bearer {token}"}
     data = {
-        "modelUri": f"gpt://{os.getenv('CATALOG_ID')}/yandexgpt-lite",
+        "modelUri": f"gpt://{os.getenv('CATALOG_ID')}/{MODEL}",
         "completionOptions": {
             "stream": False,
             "temperature": 0.9,
@@ -37,8 +77,7 @@ async def create_short_note(text: str, user_id: str, title: str, date: datetime.
         "messages": [
             {
                 "role": "system",
-                "text": "Сократи и лаконично перефразируй текст. Объём текста должен быть сокращён минимум вдвое. "
-                        "Ты должен передать основную суть, события и, самое главное, эмоции."
+                "text": PROMPT
             },
             {
                 "role": "user",
@@ -47,30 +86,68 @@ async def create_short_note(text: str, user_id: str, title: str, date: datetime.
         ]
     }
 
-    json: Dict = await make_post_request(url, data, headers)
-    result: str = json['result']['alternatives'][0]['message']['text']
+    json: Dict | None = await api_client.post_json(COMPLETION_ENDPOINT, url, data, headers,
+                                                   timeout=COMPLETION_TIMEOUT, raise_rate_limited=raise_rate_limited)
+    if json is None:
+        return None
+
+    return json['result']['alternatives'][0]['message']['text']
+
+
+async def create_short_note(text: str, user_id: str, note_id: int) -> str | None:
+    """A delayed background task which creates shortened text form of a note, adding it to the database.
+    Returns the short form, or None if it could not be created."""
+
+    result: str | None = await summarize_text(text)
+    if result is None:
+        logger.error('Short form of note %d was not created', note_id)
+        return None
+
     async with NoteStorage(user_id) as db:
-        await db.add_short_note_form(title, date, result)
+        await db.add_short_note_form(note_id, result)
 
+    return result
 
-async def obtain_new_iam_token() -> None:
-    """Ask Yandex for a new IAM-token and assign it to an environment variable."""
 
-    url = 'https://iam.api.cloud.yandex.net/iam/v1/tokens'
-    data = {
-        "yandexPassportOauthToken": os.getenv('OAUTH_TOKEN')
-    }
-    json: Dict = await make_post_request(url, data)
-    os.environ['IAM_TOKEN'] = json['iamToken']
+def _log_flight_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error('On-demand short form creation failed', exc_info=task.exception())
 
 
-async def start_scheduler(app: aiohttp.web.Application) -> None:
-    """On application start, obtain new IAM token as well as create new scheduler for doing this every hour."""
+async def request_short_note(text: str, user_id: str, note_id: int, timeout: float = SHORT_NOTE_WAIT) -> str | None:
+    """Create the short form of a note on demand. Concurrent requests for the same note share a single YandexGPT
+    call. If the short form is not ready within `timeout` seconds (or by the request's deadline), None is returned
+    while the creation itself goes on in the background and is persisted once done."""
+
+    key = (user_id, note_id)
+    task: asyncio.Task | None = _short_note_flights.get(key)
+
+    if task is None:
+        task = deadline.detached_task(create_short_note(text, user_id, note_id))
+        _short_note_flights[key] = task
+        task.add_done_callback(lambda _: _short_note_flights.pop(key, None))
+        task.add_done_callback(_log_flight_failure)
+
+    try:
+        # Shielding keeps the shared call alive when this particular waiter gives up
+        return await asyncio.wait_for(asyncio.shield(task), deadline.limit(timeout))
+    except asyncio.TimeoutError:
+        return None
 
-    await obtain_new_iam_token()
+
+async def start_scheduler(app: aiohttp.web.Application) -> None:
+    """On application start, create new scheduler which obtains an IAM token right away and then refreshes it ahead of
+    its expiry. The first token is fetched in the background, so a slow IAM service doesn't hold the startup.
+    On the leader worker, the scheduler also prunes outdated cached summaries and abandoned drafts once a day."""
 
     scheduler = AsyncIOScheduler()
-    scheduler.add_job(obtain_new_iam_token, "interval", hours=1)
+    scheduler.add_job(iam_tokens.refresh_if_needed, "interval", seconds=IAM_CHECK_INTERVAL,
+                      next_run_time=datetime.datetime.now())
+
+    # Maintenance jobs touch shared data, so with several workers only the elected one runs them
+    if app['leader']:
+        scheduler.add_job(summary_cache.prune, "interval", days=1)
+        scheduler.add_job(draft_buffer.prune, "interval", days=1)
     scheduler.start()
     app['scheduler'] = scheduler
 
@@ -79,3 +156,10 @@ async def cleanup_scheduler(app: aiohttp.web.Application) -> None:
     """Shut the scheduler down."""
 
     app['scheduler'].shutdown()
+
+
+async def cleanup_short_note_flights(app: aiohttp.web.Application) -> None:
+    """Let on-demand short form creations started by webhooks finish, so that their results are not lost."""
+
+    if _short_note_flights:
+        await asyncio.wait(list(_short_note_flights.values()), timeout=COMPLETION_TIMEOUT)
@@ -0,0 +1,80 @@
+"""A content-addressed cache of short note forms: an in-memory LRU in front of a Postgres table."""
+
+import hashlib
+import os
+import re
+from collections import OrderedDict
+from typing import Any, Dict, Final
+
+from note_storage import Database
+
+_SPACES = re.compile(r'\s+')
+_EDGE_PUNCTUATION: Final[str] = ' .,!?;:…-—"«»'
+
+
+def normalize(text: str) -> str:
+    """Bring texts which differ only in case, spacing, 'ё' spelling or punctuation at the edges to the same form."""
+
+    text = _SPACES.sub(' ', text.lower().replace('ё', 'е'))
+    return text.strip(_EDGE_PUNCTUATION)
+
+
+class SummaryCache:
+    """Maps a normalized text hash (plus the model and prompt version it was summarized with) to its short form."""
+
+    MAX_SIZE: Final[int] = int(os.getenv('SUMMARY_CACHE_SIZE', 1024))
+    TTL_DAYS: Final[int] = int(os.getenv('SUMMARY_CACHE_TTL_DAYS', 90))
+
+    def __init__(self) -> None:
+        self.__memory: OrderedDict[str, str] = OrderedDict()
+
+        self.memory_hits: int = 0
+        self.db_hits: int = 0
+        self.misses: int = 0
+
+    @staticmethod
+    def key(text: str, model: str, prompt_version: int) -> str:
+        return hashlib.sha256(f'{model}:{prompt_version}:{normalize(text)}'.encode()).hexdigest()
+
+    async def get(self, key: str) -> str | None:
+        if key in self.__memory:
+            self.__memory.move_to_end(key)
+            self.memory_hits += 1
+            return self.__memory[key]
+
+        rows = await Database.fetch('select_cached_summary', key)
+        if not rows:
+            self.misses += 1
+            return None
+
+        self.db_hits += 1
+        self.__remember(key, rows[0]['summary'])
+        return rows[0]['summary']
+
+    async def put(self, key: str, summary: str) -> None:
+        await Database.fetch('insert_cached_summary', key, summary)
+        self.__remember(key, summary)
+
+    def __remember(self, key: str, summary: str) -> None:
+        self.__memory[key] = summary
+        self.__memory.move_to_end(key)
+        if len(self.__memory) > self.MAX_SIZE:
+            self.__memory.popitem(last=False)
+
+    async def prune(self) -> None:
+        """Forget summaries older than `TTL_DAYS`, so that the table doesn't grow forever."""
+
+        await Database.fetch('prune_summary_cache', self.TTL_DAYS)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'db_hits': self.db_hits,
+            'misses': self.misses,
+            'hit_rate': (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+            'memory_size': len(self.__memory)
+        }
+
+
+summary_cache: SummaryCache = SummaryCache()
@@ -0,0 +1,144 @@
+"""A durable summarization job queue stored in Postgres and processed by a fixed pool of in-process workers.
+
+Jobs are enqueued together with their notes (see `NoteStorage.insert_draft_note`) and claimed with
+`FOR UPDATE SKIP LOCKED`, so several app instances can share the work. A claimed job is leased for a while rather than
+locked for the whole call, so the jobs of a crashed instance become available again once their lease expires."""
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Final, List
+
+import asyncpg
+from aiohttp import web
+
+from note_storage import Database
+from summarize import COMPLETION_TIMEOUT, create_short_note
+
+logger = logging.getLogger(__name__)
+
+
+class SummaryQueue:
+    """Pulls summarization jobs from the database with at most `CONCURRENCY` YandexGPT calls in flight."""
+
+    CONCURRENCY: Final[int] = int(os.getenv('SUMMARY_CONCURRENCY', 4))
+    POLL_INTERVAL: Final[float] = float(os.getenv('SUMMARY_POLL_INTERVAL', 5.0))
+    MAX_ATTEMPTS: Final[int] = int(os.getenv('SUMMARY_MAX_ATTEMPTS', 5))
+    BACKOFF_BASE: Final[float] = float(os.getenv('SUMMARY_BACKOFF_BASE', 10.0))
+    BACKOFF_MAX: Final[float] = float(os.getenv('SUMMARY_BACKOFF_MAX', 600.0))
+    LEASE: Final[float] = COMPLETION_TIMEOUT * 3
+
+    def __init__(self) -> None:
+        self.__workers: List[asyncio.Task] = []
+        self.__wakeup: asyncio.Event | None = None
+        self.__stopping: bool = False
+
+        self.processed: int = 0
+        self.retried: int = 0
+        self.failed: int = 0
+        self.in_flight: int = 0
+
+    def notify(self) -> None:
+        """Wake the workers up right away instead of waiting for the next poll. Called after enqueuing a job."""
+
+        if self.__wakeup is not None:
+            self.__wakeup.set()
+
+    async def start(self) -> None:
+        self.__stopping = False
+        self.__wakeup = asyncio.Event()
+        self.__workers = [asyncio.create_task(self.__work()) for _ in range(self.CONCURRENCY)]
+
+    async def stop(self, timeout: float = COMPLETION_TIMEOUT) -> None:
+        """Stop claiming new jobs and give the ones in flight `timeout` seconds to finish.
+        Unfinished jobs stay in the database and will be picked up again after their lease expires."""
+
+        self.__stopping = True
+        self.notify()
+
+        if self.__workers:
+            _, pending = await asyncio.wait(self.__workers, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        self.__workers = []
+
+    async def __work(self) -> None:
+        while not self.__stopping:
+            try:
+                jobs: List[asyncpg.Record] = await Database.fetch('claim_summary_jobs', 1, self.LEASE)
+            except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError, asyncio.TimeoutError):
+                logger.exception('Failed to claim a summarization job')
+                jobs = []
+
+            if not jobs:
+                await self.__sleep()
+                continue
+
+            self.in_flight += 1
+            try:
+                await self.__process(jobs[0])
+            except Exception:  # E.g. the job could not be marked; its lease will bring it back later
+                logger.exception('Failed to process summarization job %s', jobs[0]['id'])
+            finally:
+                self.in_flight -= 1
+
+    async def __sleep(self) -> None:
+        try:
+            await asyncio.wait_for(self.__wakeup.wait(), timeout=self.POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        self.__wakeup.clear()
+
+    async def __process(self, job: asyncpg.Record) -> None:
+        # The note might have been deleted while its job was waiting in the queue
+        if job['full_note'] is None:
+            await Database.fetch('complete_summary_job', job['id'])
+            return
+
+        error = 'Short form could not be created'
+        try:
+            if await create_short_note(job['full_note'], job['user_id'], job['note_id']) is not None:
+                await Database.fetch('complete_summary_job', job['id'])
+                self.processed += 1
+                return
+        except Exception as e:  # A job which keeps raising must run out of attempts like any other failing one
+            logger.exception('Failed to process summarization job %s', job['id'])
+            error = repr(e)
+
+        if job['attempts'] >= self.MAX_ATTEMPTS:
+            await Database.fetch('fail_summary_job', job['id'], error)
+            self.failed += 1
+        else:
+            backoff = min(self.BACKOFF_BASE * 2 ** (job['attempts'] - 1), self.BACKOFF_MAX)
+            await Database.fetch('retry_summary_job', job['id'], backoff, error)
+            self.retried += 1
+
+    async def stats(self) -> Dict[str, Any]:
+        """Queue depth and the age of the oldest pending job (both cluster-wide), plus this instance's counters."""
+
+        row: asyncpg.Record = (await Database.fetch('summary_jobs_stats'))[0]
+        return {
+            'depth': row['depth'],
+            'oldest_age': row['oldest_age'],
+            'in_flight': self.in_flight,
+            'processed': self.processed,
+            'retried': self.retried,
+            'failed': self.failed
+        }
+
+
+summary_queue: SummaryQueue = SummaryQueue()
+
+
+async def start_summary_queue(app: web.Application) -> None:
+    """On application start, launch the summarization workers."""
+
+    await summary_queue.start()
+
+
+async def cleanup_summary_queue(app: web.Application) -> None:
+    """Let the summarization workers finish their current jobs."""
+
+    await summary_queue.stop()
@@ -1,10 +1,10 @@
 import datetime
-from typing import Optional, List
+from typing import Dict, Optional, List
 
-import dateparser
 from asyncpg import Record
 
-from dialog_manager import DialogResponse
+from date_resolver import resolve_date
+from dialog_manager import DialogResponse, NLUEntity
 
 
 def transform_date(date: datetime.date | Record) -> str:
@@ -19,15 +19,29 @@ def transform_date(date: datetime.date | Record) -> str:
     return f'{date.day} {months[int(date.month) - 1]}' + year_str
 
 
-def parse_date(res: DialogResponse, date: str) -> Optional[datetime.date]:
-    try:
-        return dateparser.parse(date).date()
-    except AttributeError:
+def parse_date(res: DialogResponse, date: str, entity: Optional[NLUEntity] = None) -> Optional[datetime.date]:
+    result: Optional[datetime.date] = resolve_date(date, entity)
+    if result is None:
         res.send_message('Некорректная дата, попробуйте ещё раз.')
-        return None
+    return result
 
 
 def send_date_list(res: DialogResponse, notes: List[Record]) -> None:
-    date_list: List[str] = [transform_date(i[3]) for i in notes]
+    date_list: List[str] = [transform_date(i['date']) for i in notes]
     res.send_message(f"Запись с таким названием была сделана {', '.join(date_list[:-1])} и {date_list[-1]}. "
                      f"Выберите интересующий Вас день.")
+
+
+def send_suggestions(res: DialogResponse, candidates: List[Record], limit: int = 3) -> None:
+    """Offer the titles of notes found by `NoteStorage.search_notes` to a user who hasn't named any note exactly."""
+
+    titles: List[str] = list(dict.fromkeys(note['title'] for note in candidates))[:limit]
+    res.send_message(f"Возможно, вы имели в виду: {', '.join(f'«{title}»' for title in titles)}. "
+                     f"Назовите запись ещё раз.")
+
+
+def note_ids_by_date(notes: List[Record]) -> Dict[str, int]:
+    """Map ISO dates of the notes sharing a title to their ids, so that the date the user picks on the next turn
+    identifies the note without another lookup."""
+
+    return {note['date'].isoformat(): note['id'] for note in notes}
@@ -0,0 +1,7 @@
+import os
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+sys.path.insert(0, SRC)
+os.environ.setdefault('SQL_QUERIES_PATH', os.path.join(SRC, 'data', 'sql_queries.json'))
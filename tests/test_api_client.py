@@ -0,0 +1,84 @@
+import pytest
+
+pytest.importorskip('aiohttp')
+
+import api_client  # noqa: E402
+from api_client import CircuitBreaker  # noqa: E402
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now: float = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(api_client.time, 'monotonic', clock)
+    return clock
+
+
+def opened() -> CircuitBreaker:
+    breaker = CircuitBreaker(threshold=3, reset_timeout=30.0)
+    for _ in range(3):
+        breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_threshold(clock: Clock) -> None:
+    breaker = CircuitBreaker(threshold=3, reset_timeout=30.0)
+    for _ in range(2):
+        breaker.record_failure()
+        assert not breaker.is_open and breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.allow_request()
+    assert breaker.retry_in() == 30.0
+
+
+def test_success_resets_failure_count(clock: Clock) -> None:
+    breaker = CircuitBreaker(threshold=3, reset_timeout=30.0)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert not breaker.is_open and breaker.retry_in() == 0
+
+
+def test_half_open_lets_single_trial_through(clock: Clock) -> None:
+    breaker = opened()
+    clock.now += 29.0
+    assert not breaker.allow_request()
+
+    clock.now += 1.0
+    assert breaker.allow_request()
+    # The trial call is in flight, the next one waits for another reset timeout
+    assert not breaker.allow_request()
+    assert breaker.retry_in() == 30.0
+
+
+def test_closes_after_successful_trial(clock: Clock) -> None:
+    breaker = opened()
+    clock.now += 30.0
+    assert breaker.allow_request()
+
+    breaker.record_success()
+    assert not breaker.is_open
+    assert breaker.allow_request() and breaker.allow_request()
+    assert breaker.retry_in() == 0
+
+
+def test_reopens_after_failed_trial(clock: Clock) -> None:
+    breaker = opened()
+    clock.now += 30.0
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.allow_request()
+    assert breaker.retry_in() == 30.0
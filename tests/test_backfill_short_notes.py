@@ -0,0 +1,137 @@
+import asyncio
+from typing import Any, Dict, List, Set
+
+import pytest
+
+pytest.importorskip('asyncpg')
+pytest.importorskip('aiohttp')
+
+import backfill_short_notes  # noqa: E402
+from backfill_short_notes import FIRST_KEY, AimdLimiter, Backfill, Checkpoint, Key  # noqa: E402
+
+USER = 'user'
+
+
+class FakeConnection:
+    """Serves `SCAN_QUERY` and `UPDATE_QUERY` from a list of notes."""
+
+    def __init__(self, count: int) -> None:
+        self.notes: List[Dict[str, Any]] = [{'user_id': USER, 'id': i, 'full_note': f'note {i}', 'short_note': None}
+                                            for i in range(1, count + 1)]
+
+    async def fetch(self, query: str, user_id: str, id: int, limit: int) -> List[Dict[str, Any]]:
+        return [note for note in self.notes
+                if note['short_note'] is None and (note['user_id'], note['id']) > (user_id, id)][:limit]
+
+    async def execute(self, query: str, user_ids: List[str], ids: List[int], short_notes: List[str]) -> str:
+        for id, short_note in zip(ids, short_notes):
+            self.notes[id - 1]['short_note'] = short_note
+        return f'UPDATE {len(ids)}'
+
+    def summarized(self) -> List[int]:
+        return [note['id'] for note in self.notes if note['short_note'] is not None]
+
+
+@pytest.fixture
+def failing(monkeypatch: pytest.MonkeyPatch) -> Set[str]:
+    """Texts of the notes which can't be summarized, the rest are summarized right away."""
+
+    texts: Set[str] = set()
+
+    async def summarize_note(text: str, limiter: AimdLimiter, progress: Any) -> str | None:
+        return None if text in texts else f'short {text}'
+
+    monkeypatch.setattr(backfill_short_notes, 'summarize_note', summarize_note)
+    return texts
+
+
+def scan(conn: FakeConnection, checkpoint: Checkpoint, after: Key) -> Key | None:
+    backfill = Backfill(conn, checkpoint, AimdLimiter(4, 1, 4, 1.0), page_size=2)
+    return asyncio.run(backfill.scan(after))
+
+
+def test_limiter_increases_by_one_per_round() -> None:
+    async def run() -> float:
+        limiter = AimdLimiter(initial=2, minimum=1, maximum=4, target_latency=1.0)
+        for _ in range(2):
+            await limiter.acquire()
+        for _ in range(2):
+            await limiter.release(latency=0.1)
+        return limiter.limit
+
+    assert asyncio.run(run()) == pytest.approx(2 + 1 / 2 + 1 / 2.5)
+
+
+def test_limiter_does_not_exceed_maximum() -> None:
+    async def run() -> float:
+        limiter = AimdLimiter(initial=4, minimum=1, maximum=4, target_latency=1.0)
+        await limiter.acquire()
+        await limiter.release(latency=0.1)
+        return limiter.limit
+
+    assert asyncio.run(run()) == 4
+
+
+def test_limiter_decreases_once_per_round() -> None:
+    async def run() -> float:
+        limiter = AimdLimiter(initial=8, minimum=1, maximum=16, target_latency=1.0)
+        for _ in range(3):
+            await limiter.acquire()
+        # A slow call and the congested calls which were in flight along with it
+        await limiter.release(latency=2.0)
+        await limiter.release(congested=True)
+        await limiter.release(congested=True)
+        return limiter.limit
+
+    assert asyncio.run(run()) == 4
+
+
+def test_limiter_blocks_at_limit() -> None:
+    async def run() -> None:
+        limiter = AimdLimiter(initial=1, minimum=1, maximum=4, target_latency=1.0)
+        await limiter.acquire()
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.acquire(), 0.01)
+
+        await limiter.release()
+        await asyncio.wait_for(limiter.acquire(), 0.01)
+        assert limiter.in_flight == 1 and limiter.limit == 1
+
+    asyncio.run(run())
+
+
+def test_checkpoint_stays_before_failed_note(tmp_path: Any, failing: Set[str]) -> None:
+    conn, checkpoint = FakeConnection(5), Checkpoint(str(tmp_path / 'checkpoint.json'))
+    failing.add('note 3')
+
+    assert scan(conn, checkpoint, FIRST_KEY) == (USER, 2)
+    assert checkpoint.load() == (USER, 2)
+    assert conn.summarized() == [1, 2, 4, 5]
+
+
+def test_checkpoint_stays_before_failed_first_note_of_page(tmp_path: Any, failing: Set[str]) -> None:
+    conn, checkpoint = FakeConnection(5), Checkpoint(str(tmp_path / 'checkpoint.json'))
+    failing.add('note 1')
+
+    assert scan(conn, checkpoint, FIRST_KEY) == FIRST_KEY
+    assert checkpoint.load() == FIRST_KEY
+    assert conn.summarized() == [2, 3, 4, 5]
+
+
+def test_resume_from_checkpoint(tmp_path: Any, failing: Set[str]) -> None:
+    conn, checkpoint = FakeConnection(5), Checkpoint(str(tmp_path / 'checkpoint.json'))
+    checkpoint.save((USER, 3))
+
+    assert scan(conn, checkpoint, checkpoint.load()) is None
+    assert checkpoint.load() == (USER, 5)
+    assert conn.summarized() == [4, 5]
+
+
+def test_rescan_picks_up_failed_note(tmp_path: Any, failing: Set[str]) -> None:
+    conn, checkpoint = FakeConnection(5), Checkpoint(str(tmp_path / 'checkpoint.json'))
+    failing.add('note 3')
+    after = scan(conn, checkpoint, FIRST_KEY)
+
+    failing.clear()
+    assert scan(conn, checkpoint, after) is None
+    assert conn.summarized() == [1, 2, 3, 4, 5]
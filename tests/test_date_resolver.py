@@ -0,0 +1,39 @@
+import datetime
+
+import pytest
+from dateparser.date import DateDataParser
+
+import date_resolver
+
+TODAY = datetime.date(2024, 3, 12)
+
+
+@pytest.fixture(scope='module')
+def fallback() -> DateDataParser:
+    """The parser `date_resolver` falls back to, with relative dates counted from `TODAY`."""
+
+    return DateDataParser(languages=['ru'], settings={'RELATIVE_BASE': datetime.datetime(2024, 3, 12, 12)})
+
+
+@pytest.mark.parametrize('text', ['сегодня', 'вчера', 'позавчера', 'завтра', 'послезавтра', '15 мая',
+                                  '1 января 2024 года', '1 января 2024', '12.12.2023', '03.02.24', '5 дней назад',
+                                  '2024-03-12'])
+def test_fast_path_agrees_with_fallback(fallback: DateDataParser, text: str) -> None:
+    date = date_resolver._fast_path(text, TODAY)
+
+    assert date is not None
+    assert date == fallback.get_date_data(text).date_obj.date()
+
+
+def test_day_and_month_without_year(fallback: DateDataParser) -> None:
+    # dateparser reads '03.02' as 03:02 today, while a diary date is what the user means
+    assert date_resolver._fast_path('03.02', TODAY) == datetime.date(2024, 2, 3)
+    assert fallback.get_date_data('03.02').date_obj.date() == TODAY
+
+
+@pytest.mark.parametrize('text, expected', [('вчера', datetime.date(2024, 3, 11)),
+                                            ('за вчера', datetime.date(2024, 3, 11)),
+                                            ('от 9 мая', datetime.date(2024, 5, 9)),
+                                            ('31.02', None)])
+def test_resolve_string(text: str, expected: datetime.date | None) -> None:
+    assert date_resolver._resolve_string(text, TODAY) == expected